@@ -1,7 +1,26 @@
-from flask import Flask, render_template, request, redirect, session, send_file
+import time
+_app_started = time.perf_counter()
+
+from flask import Flask, render_template, request, redirect, session, send_file, jsonify, Response, g
 from werkzeug.utils import secure_filename
-import os, sqlite3, hashlib
-from utils import predict_disease, generate_pdf_report, CLASS_NAMES, get_remedy
+import os, io, tempfile, threading, uuid, zipfile
+from datetime import datetime
+from utils import (predict_input, CLASS_NAMES, get_remedy, batcher_stats, warm_up, load_stats, MODEL_PATH,
+                   inference_config)
+from bulk_predict import predict_bulk, FORMATTERS
+from prediction_cache import PredictionCache
+from jobs import JobQueue, QueueFull, StageTimer
+import reports
+import tta
+from history import HistoryStore
+from uploads import UploadStore, UploadGone
+from quality import QualityGate
+from page_cache import PageCache, etag_for
+import remedies
+from auth_utils import create_users_table, signup_user, login_user
+from credentials import KDFBusy
+import metrics
+from profiler import SamplingProfiler
 
 app = Flask(__name__)
 app.secret_key = 'your_secret_key'
@@ -9,12 +28,62 @@ app.secret_key = 'your_secret_key'
 UPLOAD_FOLDER = 'static/uploaded'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Content-addressed: static/uploaded/<aa>/<bb>/<sha256>.<ext>, swept by size and age
+upload_store = UploadStore(UPLOAD_FOLDER)
+upload_store.start_sweeper()
+
+# Keyed on the model files and on the TTA/ensemble settings, so changing either never serves stale results
+prediction_cache = PredictionCache(model_path=MODEL_PATH, ensemble_paths=tta.ENSEMBLE_MODELS,
+                                   config=inference_config())
+
+# Async mode: /predict and /report answer 202 with a job id (always, or per request with ?async=1)
+ASYNC_JOBS = os.environ.get('ASYNC_JOBS', '0') == '1'
+job_queue = JobQueue()
+
+history = HistoryStore()
+
+# Blurry, badly exposed, tiny or leafless photos are flagged, or with QUALITY_GATE=reject turned away before the CNN
+quality_gate = QualityGate()
+
+# Rendered /result and /confidence-chart per (prediction id, language), revalidated by ETag
+page_cache = PageCache()
+# Bump when the values passed to those templates change, so browsers drop pages rendered by older code
+PAGE_VERSION = 2
+
+profiler = SamplingProfiler()
+metrics.register(metrics.Gauge('job_queue_pending', "Jobs waiting for a worker",
+                               lambda: job_queue.stats()['pending']))
 
 # === DB Initialization ===
-def init_db():
-    with sqlite3.connect("users.db") as conn:
-        conn.execute("CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY, password TEXT)")
-init_db()
+create_users_table()
+
+# === Instrumentation ===
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    profiler.begin()
+
+@app.after_request
+def record_status(response):
+    g.request_status = response.status_code
+    return response
+
+@app.teardown_request
+def record_request(exc):
+    started = g.pop('request_started', None)
+    if started is None:
+        return
+    seconds = time.perf_counter() - started
+    # The rule ('/jobs/<job_id>'), not the path, keeps the number of series bounded
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.REQUEST_SECONDS.observe(seconds, route=route, method=request.method,
+                                    status=g.pop('request_status', 500))
+    if profiler.end(f"{request.method} {route}", seconds):
+        metrics.SLOW_REQUEST_PROFILES.inc(route=route)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 # === Routes ===
 @app.route('/')
@@ -25,30 +94,26 @@ def home():
 def login_page():
     return render_template('login.html')
 
+@app.errorhandler(KDFBusy)
+def kdf_busy(e):
+    # Login storms shed load instead of queueing unbounded password hashing
+    return "Too many logins right now, please retry in a moment.", 503, {'Retry-After': '2'}
+
 @app.route('/signup', methods=['GET', 'POST'])
 def signup():
     if request.method == 'POST':
-        username = request.form['username']
-        password_hash = hashlib.sha256(request.form['password'].encode()).hexdigest()
-        with sqlite3.connect("users.db") as conn:
-            try:
-                conn.execute("INSERT INTO users VALUES (?, ?)", (username, password_hash))
-                return redirect('/login_page')
-            except:
-                return render_template('signup.html', error="Username already exists!")
+        if signup_user(request.form['username'], request.form['password']):
+            return redirect('/login_page')
+        return render_template('signup.html', error="Username already exists!")
     return render_template('signup.html')
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form['username']
-        password_hash = hashlib.sha256(request.form['password'].encode()).hexdigest()
-        with sqlite3.connect("users.db") as conn:
-            user = conn.execute("SELECT * FROM users WHERE username=? AND password=?", 
-                                (username, password_hash)).fetchone()
-            if user:
-                session['username'] = username
-                return redirect('/dashboard')
+        if login_user(username, request.form['password']):
+            session['username'] = username
+            return redirect('/dashboard')
         return render_template('login.html', error="Invalid credentials")
     # GET request - show form
     return render_template('login.html')
@@ -58,6 +123,117 @@ def dashboard():
         return redirect('/')  # not logged in → home
     return render_template('dashboard.html', username=session['username'])
 
+# === Prediction ===
+def run_prediction(timer, upload, filename, username, language=None):
+    # Decoded and resized once at ingest; raises UploadGone if the sweeper got there first
+    image, original_size = upload_store.load(upload)
+    quality = None
+    # Ahead of the cache, so re-uploads keep their flag and threshold changes apply to cached images too
+    if quality_gate.enabled:
+        with timer.stage('quality'):
+            quality = quality_gate.check(image, original_size)
+        if not quality['ok']:
+            return {'rejected': True, 'filename': filename, 'image': upload.name, 'quality': quality}
+    # Re-uploads and client retries of the same bytes skip inference
+    with timer.stage('cache_lookup'):
+        cache_key = prediction_cache.key_for_digest(upload.digest)
+        cached = prediction_cache.get(cache_key)
+    if cached:
+        disease, confidence, all_probs = cached
+    else:
+        with timer.stage('inference'):
+            disease, confidence, all_probs = predict_input(image)
+        quality_gate.record_inference(timer.stages['inference'])
+        prediction_cache.put(cache_key, (disease, confidence, all_probs))
+    prediction = {
+        'id': uuid.uuid4().hex,
+        'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'username': username,
+        'filename': filename,
+        'image': upload.name,
+        'disease': disease,
+        'confidence': confidence,
+        'values': all_probs,
+        # Only set in flag mode: the prediction stands but the page shows what looked wrong.
+        # Stored with the row so /result keeps showing it on refresh and on other workers.
+        'quality': ({k: quality[k] for k in ('action', 'reasons', 'messages')}
+                    if quality and quality['reasons'] else None),
+    }
+    with timer.stage('history'):
+        history.add(prediction)
+    with timer.stage('remedy'):
+        prediction['remedy'] = get_remedy(disease, language)
+    return prediction
+
+def current_prediction():
+    # The session only carries the id; everything else comes from the history table
+    prediction_id = session.get('prediction_id')
+    data = history.get(prediction_id) if prediction_id else None
+    if data is None or data['username'] != session.get('username'):
+        return None
+    data['remedy'] = get_remedy(data['disease'])
+    return data
+
+def current_language():
+    # ?lang= sticks for the session; otherwise the browser's Accept-Language decides
+    catalog = remedies.catalog()
+    lang = request.args.get('lang')
+    if lang in catalog.languages:
+        session['lang'] = lang
+        return lang
+    if session.get('lang') in catalog.languages:
+        return session['lang']
+    return request.accept_languages.best_match(catalog.languages) or catalog.default_language
+
+def _template_mtime(name):
+    try:
+        return os.path.getmtime(os.path.join(app.root_path, app.template_folder, name))
+    except OSError:
+        return 0
+
+def cached_page(route, template, render):
+    """Serve `render(data, language)` for the session's prediction with ETag/conditional-GET support."""
+    prediction_id = session.get('prediction_id')
+    if not prediction_id:
+        return redirect('/dashboard')
+    language = current_language()
+    etag = etag_for(route, prediction_id, language, template, _template_mtime(template),
+                    remedies.catalog().version, PAGE_VERSION)
+    if etag in request.if_none_match:
+        page_cache.record_not_modified()
+        response = Response(status=304)
+    else:
+        html = page_cache.get(etag)
+        if html is None:
+            data = current_prediction()
+            if data is None:
+                return redirect('/dashboard')
+            html = render(data, language)
+            page_cache.put(etag, html)
+        response = Response(html, mimetype='text/html')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.headers['Vary'] = 'Accept-Language, Cookie'
+    return response
+
+def wants_async():
+    return ASYNC_JOBS or request.args.get('async') == '1'
+
+def run_report(timer, data):
+    with timer.stage('render'):
+        return reports.get_report(data)
+
+def send_report(pdf):
+    return send_file(io.BytesIO(pdf), mimetype='application/pdf', as_attachment=True,
+                     download_name='rice_disease_report.pdf')
+
+def submit_job(kind, fn, *args, stages=None):
+    try:
+        job = job_queue.submit(kind, session['username'], fn, *args, stages=stages)
+    except QueueFull:
+        return jsonify(error="Server busy, please retry shortly"), 429, {'Retry-After': '2'}
+    return jsonify(job_id=job.id, status_url=f'/jobs/{job.id}'), 202
+
 @app.route('/predict', methods=['POST'])
 def predict():
     if 'username' not in session:
@@ -67,65 +243,195 @@ def predict():
     if not file or file.filename == '':
         return "No image selected"
 
-    filename = secure_filename(file.filename)
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    file.save(filepath)
+    timer = StageTimer()
+    with timer.stage('save'):
+        filename = secure_filename(file.filename)
+        try:
+            upload = upload_store.ingest(file.stream, filename)
+        except (OSError, ValueError) as e:
+            return f"Could not read the uploaded image: {e}", 400
 
-    disease, confidence, all_probs = predict_disease(filepath)
-    remedy = get_remedy(disease)  # Always returns full dict now
+    if wants_async():
+        return submit_job('predict', run_prediction, upload, filename, session['username'], current_language(),
+                          stages=timer.stages)
 
-    session['prediction'] = {
-        'username': session['username'],
-        'filename': filename,
-        'disease': disease,
-        'confidence': confidence,
-        'remedy': remedy,
-        'values': all_probs
-    }
+    try:
+        prediction = run_prediction(timer, upload, filename, session['username'], current_language())
+    except UploadGone:
+        return "The uploaded image expired before it could be processed; please upload it again", 400
+    if prediction.get('rejected'):
+        with timer.stage('template'):
+            return render_template('result.html',
+                                   image=upload.name,
+                                   rejected=True,
+                                   quality=prediction['quality'],
+                                   labels=CLASS_NAMES), 422
+    session['prediction_id'] = prediction['id']
+
+    with timer.stage('template'):
+        return render_template('result.html',
+                               image=upload.name,
+                               disease=prediction['disease'],
+                               confidence=prediction['confidence'],
+                               remedy=prediction['remedy'],
+                               labels=CLASS_NAMES,
+                               values=prediction['values'],
+                               quality=prediction['quality'])
+
+@app.route('/predict-bulk', methods=['POST'])
+def predict_bulk_route():
+    if 'username' not in session:
+        return redirect('/')
+
+    file = request.files.get('archive')
+    if not file or file.filename == '':
+        return "No archive selected", 400
+    fmt = request.args.get('format', 'csv')
+    if fmt not in FORMATTERS:
+        return f"Unsupported format: {fmt}", 400
 
-    return render_template('result.html',
-                           image=filename,
-                           disease=disease,
-                           confidence=confidence,
-                           remedy=remedy,
-                           labels=CLASS_NAMES,
-                           values=all_probs)
+    fd, archive_path = tempfile.mkstemp(suffix='.zip')
+    os.close(fd)
+    file.save(archive_path)
+    # Checked before streaming: once the 200 headers are out an error can't be reported
+    if not zipfile.is_zipfile(archive_path):
+        os.remove(archive_path)
+        return "The uploaded file is not a zip archive", 400
+
+    def generate():
+        results = predict_bulk(archive_path)
+        yield from FORMATTERS[fmt](results, CLASS_NAMES)
+
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    response = Response(generate(), mimetype=mimetype,
+                        headers={'Content-Disposition': f'attachment; filename=predictions.{fmt}'})
+    # Runs even when the client disconnects before the generator starts
+    response.call_on_close(lambda: os.remove(archive_path))
+    return response
 
 @app.route('/report')
 def report():
-    if 'prediction' not in session:
+    data = current_prediction()
+    if data is None:
         return redirect('/dashboard')
-    filepath = generate_pdf_report(session['prediction'])
-    return send_file(filepath, as_attachment=True)
+    if wants_async():
+        return submit_job('report', run_report, data)
+    # Rendered once per prediction id and streamed from memory
+    return send_report(reports.get_report(data))
+
+# === Jobs ===
+def owned_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None or job.owner != session.get('username'):
+        return None
+    return job
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = owned_job(job_id)
+    if job is None:
+        return jsonify(error="Unknown job"), 404
+    status = job.to_dict()
+    if job.status == 'done':
+        if job.kind == 'predict':
+            # Let /result, /confidence-chart and /report pick the finished prediction up
+            if not job.result.get('rejected'):
+                session['prediction_id'] = job.result['id']
+            status['result'] = job.result
+        elif job.kind == 'report':
+            status['download_url'] = f'/jobs/{job.id}/download'
+    return jsonify(status)
+
+@app.route('/jobs/<job_id>/download')
+def job_download(job_id):
+    job = owned_job(job_id)
+    if job is None or job.kind != 'report' or job.status != 'done':
+        return jsonify(error="No finished report for this job"), 404
+    return send_report(job.result)
+
+@app.route('/report-stats')
+def report_stats():
+    return jsonify(reports.stats())
+
+@app.route('/job-stats')
+def job_stats():
+    return jsonify(job_queue.stats())
 
 @app.route('/confidence-chart')
 def confidence_chart():
-    if 'prediction' not in session:
-        return redirect('/dashboard')
-    data = session['prediction']
-    return render_template('confidence_chart.html',
-                           labels=CLASS_NAMES,
-                           values=data.get('values', []),
-                           disease=data['disease'],
-                           confidence=data['confidence'])
+    return cached_page('confidence-chart', 'confidence_chart.html',
+                       lambda data, language: render_template('confidence_chart.html',
+                                                              labels=CLASS_NAMES,
+                                                              values=data.get('values', []),
+                                                              disease=data['disease'],
+                                                              confidence=data['confidence'],
+                                                              language=language))
 
 @app.route('/result')
 def result():
-    if 'prediction' not in session:
-        return redirect('/dashboard')
-    data = session['prediction']
-    return render_template('result.html',
-                           image=data['filename'],
-                           disease=data['disease'],
-                           confidence=data['confidence'],
-                           remedy=data['remedy'],
-                           labels=CLASS_NAMES,
-                           values=data['values'])
+    return cached_page('result', 'result.html',
+                       lambda data, language: render_template('result.html',
+                                                              image=data.get('image') or data['filename'],
+                                                              disease=data['disease'],
+                                                              confidence=data['confidence'],
+                                                              remedy=get_remedy(data['disease'], language),
+                                                              labels=CLASS_NAMES,
+                                                              values=data['values'],
+                                                              quality=data.get('quality'),
+                                                              language=language))
+
+# === History ===
+@app.route('/history')
+def prediction_history():
+    if 'username' not in session:
+        return redirect('/')
+    return jsonify(history.page(session['username'],
+                                page=request.args.get('page', 1, type=int),
+                                per_page=request.args.get('per_page', 20, type=int)))
+
+@app.route('/history/stats')
+def prediction_history_stats():
+    if 'username' not in session:
+        return redirect('/')
+    return jsonify(history.disease_counts(session['username'],
+                                          start=request.args.get('start'),
+                                          end=request.args.get('end'),
+                                          by_day=request.args.get('by') == 'day'))
+
+@app.route('/batch-stats')
+def batch_stats():
+    return jsonify(batcher_stats() or {'enabled': False})
+
+@app.route('/cache-stats')
+def cache_stats():
+    return jsonify(prediction_cache.stats())
+
+@app.route('/page-cache-stats')
+def page_cache_stats():
+    return jsonify(page_cache.stats())
+
+@app.route('/quality-stats')
+def quality_stats():
+    return jsonify(quality_gate.stats())
+
+@app.route('/upload-stats')
+def upload_stats():
+    return jsonify(upload_store.stats())
+
+@app.route('/startup-stats')
+def startup_stats():
+    return jsonify(dict(load_stats(), app_startup_s=APP_STARTUP_S))
 
 @app.route('/logout')
 def logout():
     session.clear()
     return redirect('/')
 
+APP_STARTUP_S = round(time.perf_counter() - _app_started, 4)
+
+# Load the model in the background so the first /predict does not pay for it
+if os.environ.get('WARM_UP_MODEL', '0') == '1':
+    threading.Thread(target=warm_up, name='model-warm-up', daemon=True).start()
+
 if __name__ == '__main__':
     app.run(debug=True, port=5001)
\ No newline at end of file
@@ -1,37 +1,42 @@
 import sqlite3
-import hashlib
+
+import credentials
+import db
 
 def create_users_table():
-    conn = sqlite3.connect('database.db')
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            username TEXT PRIMARY KEY,
-            password TEXT
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    with db.transaction() as conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                username TEXT PRIMARY KEY,
+                password TEXT
+            )
+        ''')
 
 def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+    return credentials.hash_password(password)
 
 def signup_user(username, password):
-    conn = sqlite3.connect('database.db')
-    c = conn.cursor()
+    if db.query_one("SELECT 1 FROM users WHERE username = ?", (username,)):
+        return False
+    password_hash = hash_password(password)
     try:
-        c.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, hash_password(password)))
-        conn.commit()
+        with db.transaction() as conn:
+            conn.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, password_hash))
         return True
     except sqlite3.IntegrityError:
         return False
-    finally:
-        conn.close()
 
 def login_user(username, password):
-    conn = sqlite3.connect('database.db')
-    c = conn.cursor()
-    c.execute("SELECT * FROM users WHERE username = ? AND password = ?", (username, hash_password(password)))
-    result = c.fetchone()
-    conn.close()
-    return result is not None
+    row = db.query_one("SELECT password FROM users WHERE username = ?", (username,))
+    if row is None:
+        credentials.dummy_verify(password)
+        return False
+    stored = row['password']
+    if not credentials.verify_password(password, stored):
+        return False
+    # Upgrade legacy sha256 rows (and outdated scrypt costs) while we have the plaintext
+    if credentials.needs_rehash(stored):
+        with db.transaction() as conn:
+            conn.execute("UPDATE users SET password = ? WHERE username = ? AND password = ?",
+                         (hash_password(password), username, stored))
+    return True
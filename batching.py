@@ -0,0 +1,119 @@
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+# Tunables (override through the environment)
+MAX_BATCH_SIZE = int(os.environ.get('MICRO_BATCH_MAX_SIZE', 16))
+MAX_WAIT_MS = float(os.environ.get('MICRO_BATCH_MAX_WAIT_MS', 5))
+MAX_QUEUE = int(os.environ.get('MICRO_BATCH_MAX_QUEUE', 1024))
+
+
+class _Pending:
+    __slots__ = ('array', 'done', 'result', 'error')
+
+    def __init__(self, array):
+        self.array = array
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """Collects single-image requests and runs them as one forward pass.
+
+    `predict_fn` takes a stacked (N, H, W, C) array and returns (N, classes).
+    """
+
+    def __init__(self, predict_fn, max_batch_size=MAX_BATCH_SIZE,
+                 max_wait_ms=MAX_WAIT_MS, max_queue=MAX_QUEUE):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._requests = 0
+        self._max_seen = 0
+        self._size_counts = {}
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, array, timeout=None):
+        """Queue one preprocessed image (H, W, C) and block for its probability row."""
+        if self._closed:
+            raise RuntimeError("MicroBatcher is closed")
+        pending = _Pending(array)
+        self._queue.put(pending, timeout=timeout)
+        if not pending.done.wait(timeout):
+            raise TimeoutError("Timed out waiting for batched prediction")
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._closed = True
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            try:
+                stacked = np.stack([p.array for p in batch])
+                outputs = np.asarray(self.predict_fn(stacked))
+                for pending, row in zip(batch, outputs):
+                    pending.result = row
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+            finally:
+                for pending in batch:
+                    pending.done.set()
+            self._record(len(batch))
+            if self._closed:
+                return
+
+    def _record(self, size):
+        with self._stats_lock:
+            self._batches += 1
+            self._requests += size
+            self._max_seen = max(self._max_seen, size)
+            self._size_counts[size] = self._size_counts.get(size, 0) + 1
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'batches': self._batches,
+                'requests': self._requests,
+                'avg_batch_size': round(self._requests / self._batches, 3) if self._batches else 0.0,
+                'max_batch_size_seen': self._max_seen,
+                'batch_size_counts': dict(sorted(self._size_counts.items())),
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+            }
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join(timeout=5)
@@ -0,0 +1,114 @@
+"""Concurrent login/signup load: connect-per-request (old app.py) vs the pooled db.py layer.
+
+    python -m benchmarks.bench_auth [--threads 16] [--ops 400] [--signup-ratio 0.2]
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+import db
+
+
+def legacy_signup(path, username, password):
+    with sqlite3.connect(path) as conn:
+        try:
+            conn.execute("INSERT INTO users VALUES (?, ?)", (username, hashlib.sha256(password.encode()).hexdigest()))
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+def legacy_login(path, username, password):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT * FROM users WHERE username=? AND password=?",
+                            (username, hashlib.sha256(password.encode()).hexdigest())).fetchone() is not None
+
+# Same queries through db.py, so only connection handling differs (see bench_kdf for hashing cost)
+def pooled_signup(path, username, password):
+    try:
+        with db.transaction(path) as conn:
+            conn.execute("INSERT INTO users VALUES (?, ?)", (username, hashlib.sha256(password.encode()).hexdigest()))
+        return True
+    except sqlite3.IntegrityError:
+        return False
+
+def pooled_login(path, username, password):
+    return db.query_one("SELECT * FROM users WHERE username=? AND password=?",
+                        (username, hashlib.sha256(password.encode()).hexdigest()), path) is not None
+
+MODES = {'legacy': (legacy_signup, legacy_login), 'pooled': (pooled_signup, pooled_login)}
+
+
+def run(mode, threads, ops, signup_ratio, seed_users=500):
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE users (username TEXT PRIMARY KEY, password TEXT)")
+        conn.executemany("INSERT INTO users VALUES (?, ?)",
+                         [(f'user{i}', hashlib.sha256(b'pw').hexdigest()) for i in range(seed_users)])
+    db.close_all()
+    signup, login = MODES[mode]
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def worker(tid):
+        rng = random.Random(tid)
+        local_lat, local_err = [], 0
+        for i in range(ops):
+            t = time.perf_counter()
+            try:
+                if rng.random() < signup_ratio:
+                    signup(path, f'new{tid}_{i}', 'pw')
+                else:
+                    login(path, f'user{rng.randrange(seed_users)}', 'pw')
+            except sqlite3.OperationalError:
+                local_err += 1
+            local_lat.append((time.perf_counter() - t) * 1000)
+        with lock:
+            latencies.extend(local_lat)
+            errors.append(local_err)
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - started
+    db.close_all()
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    return {
+        'ops_per_s': round(len(latencies) / elapsed, 1),
+        'latency_ms_p50': round(float(np.percentile(latencies, 50)), 3),
+        'latency_ms_p95': round(float(np.percentile(latencies, 95)), 3),
+        'latency_ms_p99': round(float(np.percentile(latencies, 99)), 3),
+        'locked_errors': sum(errors),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--ops', type=int, default=400, help="Operations per thread")
+    parser.add_argument('--signup-ratio', type=float, default=0.2)
+    parser.add_argument('--output', help="Write results as JSON")
+    args = parser.parse_args(argv)
+
+    results = {mode: run(mode, args.threads, args.ops, args.signup_ratio) for mode in MODES}
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Logins/sec per core for each scrypt cost setting, through the bounded KDF pool.
+
+    python -m benchmarks.bench_kdf [--costs 12,13,14,15] [--seconds 3]
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+import credentials
+
+
+def measure(log_n, seconds, threads, r, p):
+    n = 2 ** log_n
+    stored = credentials._hash('benchmark-password', n=n, r=r, p=p)
+    # Single thread: latency of one verification
+    started = time.perf_counter()
+    single = 0
+    while time.perf_counter() - started < min(seconds, 1.0):
+        credentials._verify('benchmark-password', stored)
+        single += 1
+    single_ms = (time.perf_counter() - started) * 1000 / single
+
+    # Saturated: `threads` callers going through the bounded pool (cache disabled)
+    count = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker():
+        done = 0
+        while time.perf_counter() < deadline:
+            credentials._run(credentials._verify, 'benchmark-password', stored)
+            done += 1
+        with lock:
+            count[0] += done
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    rate = count[0] / (time.perf_counter() - started)
+    cores = min(credentials.KDF_WORKERS, os.cpu_count() or 1)
+    return {
+        'n': n, 'r': r, 'p': p,
+        'memory_mib': round(128 * n * r / 2 ** 20, 1),
+        'verify_ms': round(single_ms, 2),
+        'logins_per_s': round(rate, 1),
+        'logins_per_s_per_core': round(rate / cores, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--costs', default='12,13,14,15', help="Comma-separated log2(N) values")
+    parser.add_argument('--r', type=int, default=credentials.SCRYPT_R)
+    parser.add_argument('--p', type=int, default=credentials.SCRYPT_P)
+    parser.add_argument('--seconds', type=float, default=3)
+    parser.add_argument('--threads', type=int, default=credentials.KDF_WORKERS * 2)
+    parser.add_argument('--output', help="Write results as JSON")
+    args = parser.parse_args(argv)
+
+    results = {
+        'kdf_workers': credentials.KDF_WORKERS,
+        'cpu_count': os.cpu_count(),
+        'settings': [measure(int(c), args.seconds, args.threads, args.r, args.p) for c in args.costs.split(',')],
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+"""End-to-end load test: concurrent signup -> login -> predict -> result -> chart -> report sessions.
+
+    python -m benchmarks.bench_load [--users 8] [--iterations 5] [--model stub|real] [--output load.json]
+    python -m benchmarks.bench_load --url http://127.0.0.1:5001 ...   # an already running server
+
+Without --url a threaded server is started in a child process inside a scratch
+directory (its own users.db, uploads and caches), with the stub model unless
+--model real. Server CPU and RSS come from its /metrics endpoint.
+"""
+import argparse
+import http.client
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from urllib.parse import urlencode, urlsplit
+
+from benchmarks.common import REPO_DIR, StubModel, leaf_image, pin_model_path, scratch_dir, summarize, write_results
+
+FLOW = ('/signup', '/login', '/predict', '/result', '/confidence-chart', '/report')
+
+
+# === Server ===
+def serve(port, model, stub_latency_ms):
+    os.chdir(scratch_dir())
+    sys.path.insert(0, REPO_DIR)
+    import utils
+    if model == 'stub':
+        utils._model = StubModel(len(utils.CLASS_NAMES), stub_latency_ms)
+    from werkzeug.serving import make_server
+    from app import app
+    print(f"Serving on 127.0.0.1:{port} from {os.getcwd()}", flush=True)
+    make_server('127.0.0.1', port, app, threaded=True).serve_forever()
+
+def start_server(port, model, stub_latency_ms, timeout=120):
+    cmd = [sys.executable, '-m', 'benchmarks.bench_load', '--serve', '--port', str(port),
+           '--model', model, '--stub-latency-ms', str(stub_latency_ms)]
+    proc = subprocess.Popen(cmd, cwd=REPO_DIR)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server exited with status {proc.returncode}")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/metrics')
+            conn.getresponse().read()
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("Server did not come up in time")
+
+
+# === Client ===
+class Session:
+    """One keep-alive connection with the Flask session cookie; redirects are not followed."""
+
+    def __init__(self, host, port):
+        self.conn = http.client.HTTPConnection(host, port, timeout=120)
+        self.cookie = None
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        self.conn.request(method, path, body=body, headers=headers)
+        response = self.conn.getresponse()
+        response.read()
+        cookie = response.getheader('Set-Cookie')
+        if cookie:
+            self.cookie = cookie.split(';', 1)[0]
+        return response.status
+
+    def form(self, path, fields):
+        return self.request('POST', path, urlencode(fields),
+                            {'Content-Type': 'application/x-www-form-urlencoded'})
+
+    def upload(self, path, field, filename, data):
+        boundary = uuid.uuid4().hex
+        body = (f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+                f'Content-Type: image/jpeg\r\n\r\n').encode() + data + f'\r\n--{boundary}--\r\n'.encode()
+        return self.request('POST', path, body, {'Content-Type': f'multipart/form-data; boundary={boundary}'})
+
+
+def user_flow(host, port, user, iterations, images, record):
+    session = Session(host, port)
+    username, password = f'load-{uuid.uuid4().hex[:8]}-{user}', 'load-test-password'
+
+    def timed(route, call, *args):
+        t = time.perf_counter()
+        try:
+            status = call(*args)
+        except (OSError, http.client.HTTPException) as e:
+            status = type(e).__name__
+            session.conn.close()
+        record(route, status, (time.perf_counter() - t) * 1000)
+
+    timed('/signup', session.form, '/signup', {'username': username, 'password': password})
+    timed('/login', session.form, '/login', {'username': username, 'password': password})
+    for i in range(iterations):
+        name, data = images[(user * iterations + i) % len(images)]
+        timed('/predict', session.upload, '/predict', 'image', name, data)
+        for route in ('/result', '/confidence-chart', '/report'):
+            timed(route, session.request, 'GET', route)
+
+
+# === Server resources from /metrics ===
+_SAMPLE = re.compile(r'^([a-z_]+)(\{[^}]*\})? (\S+)$')
+
+def scrape(host, port):
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    conn.request('GET', '/metrics')
+    text = conn.getresponse().read().decode()
+    values = {}
+    for line in text.splitlines():
+        m = _SAMPLE.match(line)
+        if m:
+            values[m.group(1) + (m.group(2) or '')] = float(m.group(3))
+    return values
+
+class ResourceMonitor(threading.Thread):
+    def __init__(self, host, port, interval=0.5):
+        super().__init__(daemon=True)
+        self.host, self.port, self.interval = host, port, interval
+        self.rss = []
+        self.first = self.last = None
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.is_set():
+            self.sample()
+            self._done.wait(self.interval)
+
+    def sample(self):
+        try:
+            values = scrape(self.host, self.port)
+        except (OSError, http.client.HTTPException):
+            return
+        self.first = self.first or values
+        self.last = values
+        if 'process_resident_memory_bytes' in values:
+            self.rss.append(values['process_resident_memory_bytes'])
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        self.sample()
+
+    def report(self, seconds):
+        if not self.first:
+            return {}
+        cpu = self.last.get('process_cpu_seconds_total', 0) - self.first.get('process_cpu_seconds_total', 0)
+        stages = {}
+        for key, total in self.last.items():
+            m = re.match(r'stage_duration_seconds_sum\{stage="([^"]+)"\}', key)
+            if m:
+                count = self.last.get(f'stage_duration_seconds_count{{stage="{m.group(1)}"}}', 0)
+                before = self.first.get(f'stage_duration_seconds_count{{stage="{m.group(1)}"}}', 0)
+                spent = total - self.first.get(key, 0)
+                if count > before:
+                    stages[m.group(1)] = round(spent / (count - before) * 1000, 3)
+        return {
+            'cpu_seconds': round(cpu, 3),
+            'cpu_cores_used': round(cpu / seconds, 2) if seconds else None,
+            'rss_mb_start': round(self.rss[0] / 2 ** 20, 1) if self.rss else None,
+            'rss_mb_peak': round(max(self.rss) / 2 ** 20, 1) if self.rss else None,
+            'rss_mb_end': round(self.rss[-1] / 2 ** 20, 1) if self.rss else None,
+            'stage_mean_ms': stages,
+        }
+
+
+def run(url, users, iterations, image_count):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    images = [(f'leaf_{i}.jpg', leaf_image(i)) for i in range(image_count)]
+    samples = {route: [] for route in FLOW}
+    statuses = {route: {} for route in FLOW}
+    lock = threading.Lock()
+
+    def record(route, status, ms):
+        with lock:
+            samples[route].append(ms)
+            statuses[route][str(status)] = statuses[route].get(str(status), 0) + 1
+
+    monitor = ResourceMonitor(host, port)
+    monitor.start()
+    started = time.perf_counter()
+    threads = [threading.Thread(target=user_flow, args=(host, port, u, iterations, images, record))
+               for u in range(users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    seconds = time.perf_counter() - started
+    monitor.stop()
+
+    routes = {}
+    for route in FLOW:
+        entry = summarize(samples[route])
+        entry['requests_per_s'] = round(len(samples[route]) / seconds, 2)
+        entry['statuses'] = statuses[route]
+        routes[route] = entry
+    total = sum(len(v) for v in samples.values())
+    return {
+        'url': url, 'users': users, 'iterations': iterations, 'images': image_count,
+        'duration_s': round(seconds, 3),
+        'requests': total,
+        'requests_per_s': round(total / seconds, 2),
+        'predictions_per_s': round(len(samples['/predict']) / seconds, 2),
+        'routes': routes,
+        'server': monitor.report(seconds),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help="Target an already running server instead of starting one")
+    parser.add_argument('--users', type=int, default=8, help="Concurrent sessions")
+    parser.add_argument('--iterations', type=int, default=5, help="predict/result/chart/report rounds per session")
+    parser.add_argument('--images', type=int, default=20, help="Distinct synthetic leaf photos")
+    parser.add_argument('--model', choices=['stub', 'real'], default='stub')
+    parser.add_argument('--stub-latency-ms', type=float, default=20.0)
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--output', help="Write results as JSON")
+    parser.add_argument('--baseline', help="Earlier --output file to compare against")
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.model == 'real':
+        pin_model_path()
+    if args.serve:
+        return serve(args.port, args.model, args.stub_latency_ms)
+
+    server = None
+    url = args.url
+    if url is None:
+        server = start_server(args.port, args.model, args.stub_latency_ms)
+        url = f'http://127.0.0.1:{args.port}'
+    try:
+        results = run(url, args.users, args.iterations, args.images)
+        if server is not None:
+            results.update(model=args.model, stub_latency_ms=args.stub_latency_ms if args.model == 'stub' else None)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    write_results(results, args.output, args.baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Microbenchmarks for predict_disease, get_remedy and generate_pdf_report.
+
+    python -m benchmarks.bench_micro [--model stub|real] [--output micro.json] [--baseline old.json]
+
+Runs in a scratch directory, so uploads and reports never land in the repo.
+Save a run per commit with --output and pass an older one as --baseline to
+see p50/p95 ratios.
+"""
+import argparse
+import os
+import sys
+import time
+
+from benchmarks.common import (REPO_DIR, StubModel, leaf_image, pin_model_path, scratch_dir, summarize,
+                               write_results)
+
+
+def timed(fn, args_list):
+    latencies = []
+    for args in args_list:
+        t = time.perf_counter()
+        fn(*args)
+        latencies.append((time.perf_counter() - t) * 1000)
+    return summarize(latencies)
+
+def timed_blocks(fn, args, calls, block=1000):
+    """For sub-microsecond calls: per-call time averaged over blocks of `block` calls."""
+    latencies = []
+    for _ in range(max(1, calls // block)):
+        t = time.perf_counter()
+        for _ in range(block):
+            fn(*args)
+        latencies.append((time.perf_counter() - t) * 1000 / block)
+    return summarize(latencies)
+
+
+def run(model='stub', stub_latency_ms=20.0, images=50, remedy_calls=100000, reports=30):
+    workdir = scratch_dir()
+    os.chdir(workdir)
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+    import utils
+    if model == 'stub':
+        utils._model = StubModel(len(utils.CLASS_NAMES), stub_latency_ms)
+    else:
+        utils.warm_up()
+
+    os.makedirs('static/uploaded', exist_ok=True)
+    paths = []
+    for i in range(images):
+        path = os.path.join('static/uploaded', f'leaf_{i}.jpg')
+        with open(path, 'wb') as f:
+            f.write(leaf_image(i))
+        paths.append(path)
+    utils.predict_disease(paths[0])  # thread buffer, batcher thread
+
+    results = {'model': model, 'workdir': workdir, 'micro_batching': utils.MICRO_BATCHING}
+    if model == 'stub':
+        results['stub_latency_ms'] = stub_latency_ms
+    results['predict_disease'] = timed(utils.predict_disease, [(p,) for p in paths])
+
+    names = utils.CLASS_NAMES
+    results['get_remedy'] = {
+        'known': timed_blocks(utils.get_remedy, (names[0],), remedy_calls),
+        'unknown': timed_blocks(utils.get_remedy, ('Not_A_Disease',), remedy_calls),
+    }
+
+    def data(i):
+        disease = names[i % len(names)]
+        return {'id': f'bench-{i}', 'username': 'bench', 'filename': os.path.basename(paths[i % len(paths)]),
+                'disease': disease, 'confidence': 91.5, 'remedy': utils.get_remedy(disease)}
+
+    results['generate_pdf_report'] = {
+        # New prediction ids: thumbnail + full render
+        'cold': timed(utils.generate_pdf_report, [(data(i),) for i in range(reports)]),
+        # Same id again: served from the report cache, only the file write remains
+        'cached': timed(utils.generate_pdf_report, [(data(0),) for _ in range(reports)]),
+    }
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', choices=['stub', 'real'], default='stub',
+                        help="'real' loads the configured INFERENCE_BACKEND / MODEL_PATH")
+    parser.add_argument('--stub-latency-ms', type=float, default=20.0)
+    parser.add_argument('--images', type=int, default=50)
+    parser.add_argument('--remedy-calls', type=int, default=100000)
+    parser.add_argument('--reports', type=int, default=30)
+    parser.add_argument('--output', help="Write results as JSON")
+    parser.add_argument('--baseline', help="Earlier --output file to compare against")
+    args = parser.parse_args(argv)
+    if args.model == 'real':
+        pin_model_path()
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+    results = run(args.model, args.stub_latency_ms, args.images, args.remedy_calls, args.reports)
+    write_results(results, output, baseline)
+
+
+if __name__ == '__main__':
+    main()
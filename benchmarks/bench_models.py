@@ -0,0 +1,138 @@
+"""Size, CPU latency, throughput and validation accuracy for trained model files.
+
+    python -m benchmarks.bench_models MODEL [MODEL ...] [--data-dir DIR | --shards CACHE_DIR] [--batch-size 32]
+
+MODEL is a .h5/.keras, .tflite or .onnx file, e.g. one per architecture trained with
+`python train_model.py --architecture mobilenet_v3_small --model-path mnv3s.h5`.
+Each model is measured in a fresh process so load time and RSS are its own.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+import metrics
+
+
+def count_params(backend, model, path):
+    if backend == 'keras':
+        return int(model.model.count_params())
+    if backend == 'onnx':
+        import onnx
+        return int(sum(np.prod(t.dims) for t in onnx.load(path).graph.initializer))
+    return None  # tflite does not tell weights from activations; benchmark the .h5 for this figure
+
+def percentile(values, q):
+    return round(float(np.percentile(values, q)), 3) if values else None
+
+
+def _evenly(n, limit):
+    # Evenly spaced, so every class is still represented
+    return np.linspace(0, n - 1, limit).astype(int)
+
+def _shard_batches(cache_dir, batch_size, limit):
+    """Validation split of a dataset_cache.py shard set, sliced from the memory-mapped shards."""
+    from dataset_cache import ShardedDataset
+    data = ShardedDataset(cache_dir)
+    _, val = data.split()
+    if limit and limit < len(val):
+        val = val[_evenly(len(val), limit)]
+    out = np.empty((batch_size, data.img_size[1], data.img_size[0], 3), dtype=np.float32)
+    for images, labels in data.iter_batches(val, batch_size):
+        batch = out[:len(images)]
+        np.multiply(images, np.float32(1 / 255), out=batch, casting='unsafe')
+        yield batch, labels
+
+def _validation_batches(data_dir, batch_size, limit):
+    from input_pipeline import list_split
+    from preprocessing import BatchBuffer
+    _, _, (files, labels) = list_split(data_dir)
+    if limit and limit < len(files):
+        keep = _evenly(len(files), limit)
+        files, labels = [files[i] for i in keep], [labels[i] for i in keep]
+    buf = BatchBuffer(batch_size)
+    for start in range(0, len(files), batch_size):
+        chunk = files[start:start + batch_size]
+        for i, path in enumerate(chunk):
+            buf.load(i, path, draft=False)
+        yield buf.normalized(len(chunk)), np.asarray(labels[start:start + len(chunk)])
+
+def _measure(path, data_dir, batch_size, repeats, limit, shards=None):
+    from inference_backends import backend_for_path, load_backend
+    from preprocessing import IMG_SIZE
+    backend = backend_for_path(path)
+    started = time.perf_counter()
+    model = load_backend(backend, path)
+    load_s = time.perf_counter() - started
+
+    rng = np.random.default_rng(0)
+    single = rng.random((1, IMG_SIZE[1], IMG_SIZE[0], 3), dtype=np.float32)
+    batch = rng.random((batch_size, IMG_SIZE[1], IMG_SIZE[0], 3), dtype=np.float32)
+    model.predict(single)  # first call builds kernels / allocates tensors
+    latencies = []
+    for _ in range(repeats):
+        t = time.perf_counter()
+        model.predict(single)
+        latencies.append((time.perf_counter() - t) * 1000)
+
+    model.predict(batch)
+    rounds = max(1, repeats // batch_size)
+    t = time.perf_counter()
+    for _ in range(rounds):
+        model.predict(batch)
+    throughput = rounds * batch_size / (time.perf_counter() - t)
+
+    result = {
+        'backend': backend,
+        'params': count_params(backend, model, path),
+        'file_mb': round(os.path.getsize(path) / 1e6, 3),
+        'load_s': round(load_s, 3),
+        'latency_ms_p50': percentile(latencies, 50),
+        'latency_ms_p95': percentile(latencies, 95),
+        f'batch{batch_size}_images_per_s': round(throughput, 1),
+    }
+    if data_dir or shards:
+        batches = (_shard_batches(shards, batch_size, limit) if shards
+                   else _validation_batches(data_dir, batch_size, limit))
+        correct = seen = 0
+        for images, labels in batches:
+            correct += int((np.asarray(model.predict(images)).argmax(1) == labels).sum())
+            seen += len(labels)
+        result['val_images'] = seen
+        result['val_accuracy'] = round(correct / seen, 4) if seen else None
+    peak = metrics.peak_resident_memory_bytes()
+    result['max_rss_mb'] = round(peak / 2 ** 20, 1) if peak is not None else None
+    return result
+
+def benchmark(paths, data_dir=None, batch_size=32, repeats=100, limit=None, shards=None):
+    ctx = multiprocessing.get_context('spawn')
+    results = {}
+    for path in paths:
+        with ctx.Pool(1) as pool:
+            results[path] = pool.apply(_measure, (path, data_dir, batch_size, repeats, limit, shards))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('models', nargs='+')
+    parser.add_argument('--data-dir', help="Dataset folder; its validation split gives val_accuracy")
+    parser.add_argument('--shards', help="dataset_cache.py shard set to take the validation split from instead")
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--repeats', type=int, default=100, help="Single-image timing runs")
+    parser.add_argument('--limit', type=int, help="Cap on validation images")
+    parser.add_argument('--output', help="Write results as JSON")
+    args = parser.parse_args(argv)
+
+    results = benchmark(args.models, args.data_dir, args.batch_size, args.repeats, args.limit, args.shards)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
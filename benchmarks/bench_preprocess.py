@@ -0,0 +1,95 @@
+"""Per-image latency and peak allocation: legacy load_img path vs preprocessing.py.
+
+    python -m benchmarks.bench_preprocess [--images DIR] [--repeats N]
+"""
+import argparse
+import io
+import json
+import os
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+import preprocessing
+from bulk_predict import iter_sources
+
+
+def legacy(source):
+    # What predict_disease used to do via keras load_img/img_to_array
+    img = Image.open(source).convert('RGB').resize(preprocessing.IMG_SIZE, Image.NEAREST)
+    arr = np.asarray(img, dtype=np.float32) / 255.0
+    return np.expand_dims(arr, axis=0)
+
+def draft_buffer(source):
+    buf = preprocessing.thread_buffer()
+    buf.load(0, source, draft=True)
+    return buf.normalized(1)
+
+def full_buffer(source):
+    buf = preprocessing.thread_buffer()
+    buf.load(0, source, draft=False)
+    return buf.normalized(1)
+
+PATHS = {'legacy': legacy, 'buffer': full_buffer, 'buffer+draft': draft_buffer}
+
+
+def synthetic_images(count=8, size=(3000, 4000)):
+    rng = np.random.default_rng(0)
+    for i in range(count):
+        # Smooth gradients + noise compress like real photos rather than pure noise
+        base = np.linspace(0, 255, size[0] * size[1], dtype=np.float32).reshape(size[1], size[0])
+        rgb = np.stack([base, base[::-1], np.full_like(base, 90)], axis=-1)
+        rgb += rng.normal(0, 12, rgb.shape).astype(np.float32)
+        buf = io.BytesIO()
+        Image.fromarray(np.clip(rgb, 0, 255).astype(np.uint8)).save(buf, 'JPEG', quality=90)
+        yield f'synthetic_{i}.jpg', buf.getvalue()
+
+def measure(fn, payloads, repeats):
+    fn(io.BytesIO(payloads[0]))  # warm the thread buffer
+    latencies = []
+    for _ in range(repeats):
+        for data in payloads:
+            t = time.perf_counter()
+            fn(io.BytesIO(data))
+            latencies.append((time.perf_counter() - t) * 1000)
+    tracemalloc.start()
+    for data in payloads:
+        fn(io.BytesIO(data))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        'latency_ms_p50': round(float(np.percentile(latencies, 50)), 3),
+        'latency_ms_mean': round(float(np.mean(latencies)), 3),
+        'peak_alloc_kb': round(peak / 1024, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--images', help="Folder or zip of sample photos (default: synthetic 12MP JPEGs)")
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--output', help="Write results as JSON")
+    args = parser.parse_args(argv)
+
+    if args.images:
+        payloads = [read() for _, read in iter_sources(args.images)]
+    else:
+        payloads = [data for _, data in synthetic_images()]
+
+    reference = np.concatenate([legacy(io.BytesIO(d)) for d in payloads])
+    results = {'images': len(payloads)}
+    for name, fn in PATHS.items():
+        results[name] = measure(fn, payloads, args.repeats)
+        out = np.concatenate([fn(io.BytesIO(d)).copy() for d in payloads])
+        results[name]['max_abs_diff_vs_legacy'] = round(float(np.abs(out - reference).max()), 4)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
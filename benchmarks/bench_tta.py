@@ -0,0 +1,92 @@
+"""Accuracy gain and latency cost of test-time augmentation / ensembling (tta.py).
+
+    python -m benchmarks.bench_tta DATA_DIR [--model rice_disease_model.h5] [--ensemble a.tflite,b.onnx]
+                                   [--thresholds 50,60,70,80] [--limit 500]
+
+DATA_DIR is laid out as <class>/<image>. Every image is timed once as a single
+pass and once with TTA across all models. The auto mode for each threshold is
+then derived from those two runs: the single pass, plus the TTA pass whenever
+the single-pass confidence falls below the threshold.
+"""
+import argparse
+import time
+
+import numpy as np
+
+import preprocessing
+import tta
+from benchmarks.common import summarize, write_results
+from evaluate import list_labeled
+
+
+def run(data_dir, model_path, ensemble, thresholds, limit=None, kinds=tta.VIEWS):
+    from inference_backends import backend_for_path, load_backend
+    with open('class_labels.txt') as f:
+        class_names = [line.strip() for line in f if line.strip()]
+    files, labels = list_labeled(data_dir, class_names)
+    if limit and limit < len(files):
+        keep = np.linspace(0, len(files) - 1, limit).astype(int)
+        files, labels = [files[i] for i in keep], labels[keep]
+
+    models = [load_backend(backend_for_path(p), p) for p in [model_path] + ensemble]
+    fns = [m.predict for m in models]
+    image = np.asarray(preprocessing.decode(files[0]))
+    tta.predict(image, fns, kinds)  # warm every model at the TTA batch size
+
+    single_conf, single_pred, single_ms, tta_pred, tta_ms = [], [], [], [], []
+    for path in files:
+        image = np.asarray(preprocessing.decode(path))
+        batch = np.multiply(image[np.newaxis], np.float32(1 / 255), dtype=np.float32)
+        t = time.perf_counter()
+        probs = np.asarray(fns[0](batch))[0]
+        single_ms.append((time.perf_counter() - t) * 1000)
+        single_conf.append(float(probs.max()) * 100)
+        single_pred.append(int(probs.argmax()))
+        t = time.perf_counter()
+        tta_pred.append(int(np.argmax(tta.predict(image, fns, kinds))))
+        tta_ms.append((time.perf_counter() - t) * 1000)
+
+    single_conf, single_pred, tta_pred = map(np.asarray, (single_conf, single_pred, tta_pred))
+    single_ms, tta_ms = np.asarray(single_ms), np.asarray(tta_ms)
+    results = {
+        'images': len(files),
+        'models': [model_path] + ensemble,
+        'views': len(tta.views(image, kinds)),
+        'single': dict(summarize(single_ms), accuracy=round(float(np.mean(single_pred == labels)), 4)),
+        'always': dict(summarize(single_ms + tta_ms), accuracy=round(float(np.mean(tta_pred == labels)), 4)),
+        'auto': {},
+    }
+    for threshold in thresholds:
+        triggered = single_conf < threshold
+        pred = np.where(triggered, tta_pred, single_pred)
+        entry = summarize(single_ms + np.where(triggered, tta_ms, 0))
+        entry.update(accuracy=round(float(np.mean(pred == labels)), 4),
+                     trigger_rate=round(float(triggered.mean()), 4),
+                     mean_overhead_ms=round(float((np.where(triggered, tta_ms, 0)).mean()), 3))
+        results['auto'][str(threshold)] = entry
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('data_dir')
+    parser.add_argument('--model', default=None, help="Serving model file (default: MODEL_PATH)")
+    parser.add_argument('--ensemble', default=','.join(tta.ENSEMBLE_MODELS), help="Comma-separated extra model files")
+    parser.add_argument('--thresholds', default='50,60,70,80', help="Comma-separated confidence percentages")
+    parser.add_argument('--views', default=','.join(tta.VIEWS), help="Any of flip,crop,scale")
+    parser.add_argument('--limit', type=int)
+    parser.add_argument('--output', help="Write results as JSON")
+    parser.add_argument('--baseline', help="Earlier --output file to compare against")
+    args = parser.parse_args(argv)
+
+    if args.model is None:
+        from utils import MODEL_PATH
+        args.model = MODEL_PATH
+    ensemble = [p for p in args.ensemble.split(',') if p]
+    thresholds = [float(t) for t in args.thresholds.split(',')]
+    kinds = tuple(v for v in args.views.split(',') if v)
+    write_results(run(args.data_dir, args.model, ensemble, thresholds, args.limit, kinds), args.output, args.baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Helpers shared by bench_load and bench_micro."""
+import io
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def summarize(latencies_ms):
+    values = np.asarray(latencies_ms, dtype=np.float64)
+    if not len(values):
+        return {'count': 0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'count': int(len(values)), 'mean_ms': round(float(values.mean()), 3),
+            'p50_ms': round(float(p50), 3), 'p95_ms': round(float(p95), 3), 'p99_ms': round(float(p99), 3),
+            'max_ms': round(float(values.max()), 3)}
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def write_results(results, path, baseline=None):
+    """Save results (tagged with the commit) and print p50/p95 ratios against an earlier run."""
+    results = dict(results, revision=git_revision(), time=time.strftime('%Y-%m-%dT%H:%M:%S'))
+    if path:
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+    if baseline:
+        with open(baseline) as f:
+            old = json.load(f)
+        print(f"\nvs {baseline} ({old.get('revision')}): ratio > 1 is slower")
+        for name, now in _timed(results):
+            before = dict(_timed(old)).get(name)
+            if before and before.get('p50_ms') and now.get('p50_ms'):
+                print(f"  {name:40s} p50 x{now['p50_ms'] / before['p50_ms']:.2f}"
+                      f"  p95 x{now['p95_ms'] / before['p95_ms']:.2f}")
+    return results
+
+def _timed(tree, prefix=''):
+    """(dotted name, summary) for every nested dict that carries percentiles."""
+    for key, value in tree.items():
+        if isinstance(value, dict):
+            if 'p50_ms' in value:
+                yield prefix + key, value
+            else:
+                yield from _timed(value, prefix + key + '.')
+
+
+# === Synthetic inputs ===
+def leaf_image(seed, size=(1024, 768), quality=90):
+    """JPEG bytes of a green leaf-like texture with brown lesions; different for every seed."""
+    rng = np.random.default_rng(seed)
+    w, h = size
+    y, x = np.mgrid[0:h, 0:w].astype(np.float32)
+    veins = 0.5 + 0.5 * np.sin(x / rng.uniform(6, 14) + y / rng.uniform(40, 80))
+    img = np.stack([60 + 40 * veins, 120 + 70 * veins, 40 + 20 * veins], axis=-1)
+    for _ in range(rng.integers(2, 12)):
+        cx, cy, r = rng.uniform(0, w), rng.uniform(0, h), rng.uniform(8, 60)
+        spot = ((x - cx) ** 2 + (y - cy) ** 2) < r ** 2
+        img[spot] = (130, 85, 40)
+    img += rng.normal(0, 6, img.shape).astype(np.float32)
+    buf = io.BytesIO()
+    Image.fromarray(np.clip(img, 0, 255).astype(np.uint8)).save(buf, 'JPEG', quality=quality)
+    return buf.getvalue()
+
+
+class StubModel:
+    """Stands in for the inference backend: fixed per-batch latency, deterministic output."""
+
+    def __init__(self, num_classes, latency_ms=20.0):
+        self.num_classes = num_classes
+        self.latency = latency_ms / 1000.0
+
+    def predict(self, batch):
+        time.sleep(self.latency)
+        means = batch.reshape(len(batch), -1, 3).mean(axis=1)
+        logits = np.tile(np.arange(self.num_classes, dtype=np.float32), (len(batch), 1))
+        logits[:, 0] += means[:, 0] * 10
+        out = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return out / out.sum(axis=1, keepdims=True)
+
+
+def scratch_dir():
+    """Temporary working directory holding class_labels.txt, so runs never write into the repo."""
+    path = tempfile.mkdtemp(prefix='rice-bench-')
+    shutil.copy(os.path.join(REPO_DIR, 'class_labels.txt'), path)
+    return path
+
+def pin_model_path():
+    """Make MODEL_PATH absolute before we chdir into a scratch directory."""
+    from inference_backends import DEFAULT_ARTIFACTS
+    backend = os.environ.get('INFERENCE_BACKEND', 'keras')
+    if backend != 'remote':
+        os.environ['MODEL_PATH'] = os.path.abspath(os.environ.get('MODEL_PATH') or DEFAULT_ARTIFACTS[backend])
@@ -0,0 +1,171 @@
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from preprocessing import BatchBuffer
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp', '.tif', '.tiff')
+BATCH_SIZE = 32
+WORKERS = min(8, os.cpu_count() or 1)
+
+
+# === Sources ===
+def _is_image(name):
+    base = os.path.basename(name)
+    return not base.startswith('.') and base.lower().endswith(IMAGE_EXTENSIONS)
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def iter_sources(path):
+    """Yield (name, read) pairs for every image in a directory tree or zip archive."""
+    if not isinstance(path, str) or zipfile.is_zipfile(path):
+        archive = zipfile.ZipFile(path)
+        for info in archive.infolist():
+            if not info.is_dir() and _is_image(info.filename):
+                yield info.filename, (lambda n=info.filename: archive.read(n))
+    elif os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for f in sorted(files):
+                if _is_image(f):
+                    full = os.path.join(root, f)
+                    yield os.path.relpath(full, path), (lambda p=full: _read_file(p))
+    else:
+        raise ValueError(f"Not a directory or zip archive: {path}")
+
+
+# === Prediction ===
+def _decode_into(buf, index, source):
+    name, read = source
+    try:
+        buf.load(index, io.BytesIO(read()))
+    except Exception as e:
+        return e
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def predict_bulk(path, batch_size=BATCH_SIZE, workers=WORKERS):
+    """Yield one result dict per image, in source order.
+
+    Images are decoded straight into one of two preallocated batch buffers, so
+    decoding the next chunk overlaps with inference on the current one.
+    """
+    from utils import predict_batch, format_prediction
+    buffers = [BatchBuffer(batch_size), BatchBuffer(batch_size)]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        def start(chunk, buf):
+            if chunk is None:
+                return None
+            return chunk, buf, [pool.submit(_decode_into, buf, i, src) for i, src in enumerate(chunk)]
+
+        chunks = _chunks(iter_sources(path), batch_size)
+        current = start(next(chunks, None), buffers[0])
+        turn = 1
+        while current is not None:
+            chunk, buf, futures = current
+            errors = [f.result() for f in futures]
+            current = start(next(chunks, None), buffers[turn])
+            turn ^= 1
+
+            batch = buf.normalized(len(chunk))
+            ok = [i for i, e in enumerate(errors) if e is None]
+            if len(ok) < len(chunk):
+                batch = batch[ok]
+            outputs = iter(predict_batch(batch) if ok else [])
+            for (name, _), error in zip(chunk, errors):
+                if error is not None:
+                    yield {'image': name, 'disease': None, 'confidence': None,
+                           'probs': None, 'error': str(error)}
+                else:
+                    disease, confidence, probs = format_prediction(next(outputs))
+                    yield {'image': name, 'disease': disease, 'confidence': confidence,
+                           'probs': probs, 'error': None}
+
+
+# === Output ===
+def iter_jsonl(results, class_names):
+    for row in results:
+        if row['probs'] is not None:
+            row = dict(row, probs=dict(zip(class_names, row['probs'])))
+        yield json.dumps(row) + '\n'
+
+def iter_csv(results, class_names):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(['image', 'disease', 'confidence', 'error'] + list(class_names))
+    for row in results:
+        probs = row['probs'] or [''] * len(class_names)
+        writer.writerow([row['image'], row['disease'] or '', row['confidence'] or '',
+                         row['error'] or ''] + list(probs))
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+
+FORMATTERS = {'csv': iter_csv, 'jsonl': iter_jsonl}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk rice disease prediction over a folder or zip archive")
+    parser.add_argument('source', help="Directory of images or a .zip archive")
+    parser.add_argument('-o', '--output', help="Output file (default: stdout)")
+    parser.add_argument('-f', '--format', choices=sorted(FORMATTERS), default='csv')
+    parser.add_argument('-b', '--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('-w', '--workers', type=int, default=WORKERS)
+    parser.add_argument('--pdf', help="Also write one PDF report covering every image")
+    args = parser.parse_args(argv)
+
+    from utils import CLASS_NAMES
+    results = predict_bulk(args.source, batch_size=args.batch_size, workers=args.workers)
+    collected = []
+    if args.pdf:
+        results = _collect(results, collected)
+    out = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        for line in FORMATTERS[args.format](results, CLASS_NAMES):
+            out.write(line)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    if args.pdf:
+        write_batch_report(args.pdf, args.source, collected)
+
+def _collect(results, into):
+    for row in results:
+        into.append(row)
+        yield row
+
+def write_batch_report(path, source, results):
+    import reports
+    from utils import get_remedy
+    is_dir = isinstance(source, str) and os.path.isdir(source)
+    predictions = [{
+        'username': 'bulk',
+        'filename': row['image'],
+        'image_path': os.path.join(source, row['image']) if is_dir else None,
+        'disease': row['disease'],
+        'confidence': row['confidence'],
+        'remedy': get_remedy(row['disease']),
+    } for row in results if row['error'] is None]
+    with open(path, 'wb') as f:
+        f.write(reports.render_batch_report(predictions))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# scrypt cost: memory per hash is 128 * N * r bytes (16 MiB at the defaults)
+SCRYPT_N = int(os.environ.get('KDF_SCRYPT_N', 2 ** 14))
+SCRYPT_R = int(os.environ.get('KDF_SCRYPT_R', 8))
+SCRYPT_P = int(os.environ.get('KDF_SCRYPT_P', 1))
+DKLEN = 32
+SALT_BYTES = 16
+
+# At most KDF_WORKERS hashes run at once; callers wait up to KDF_WAIT_S for a slot
+KDF_WORKERS = int(os.environ.get('KDF_WORKERS', os.cpu_count() or 2))
+KDF_WAIT_S = float(os.environ.get('KDF_WAIT_S', 5))
+
+# Recently verified (hash, password) pairs skip the KDF for a short while
+VERIFY_CACHE_TTL = float(os.environ.get('KDF_VERIFY_CACHE_TTL', 300))
+VERIFY_CACHE_SIZE = 10000
+
+_LEGACY_SHA256 = re.compile(r'^[0-9a-f]{64}$')
+
+
+class KDFBusy(Exception):
+    pass
+
+
+# === Hash format: scrypt$N$r$p$salt$hash ===
+def _b64(raw):
+    return base64.b64encode(raw).decode()
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r + (1 << 20), dklen=DKLEN)
+
+def _hash(password, n=None, r=None, p=None):
+    n, r, p = n or SCRYPT_N, r or SCRYPT_R, p or SCRYPT_P
+    salt = os.urandom(SALT_BYTES)
+    return f"scrypt${n}${r}${p}${_b64(salt)}${_b64(_scrypt(password, salt, n, r, p))}"
+
+def _verify(password, stored):
+    if _LEGACY_SHA256.match(stored):
+        return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored)
+    try:
+        scheme, n, r, p, salt, expected = stored.split('$')
+        if scheme != 'scrypt':
+            return False
+        actual = _scrypt(password, base64.b64decode(salt), int(n), int(r), int(p))
+        return hmac.compare_digest(actual, base64.b64decode(expected))
+    except (ValueError, binascii.Error):
+        # A corrupt row (or cost parameters hashlib refuses) is a failed login, not a 500
+        return False
+
+def needs_rehash(stored):
+    """True for legacy unsalted sha256 rows and scrypt rows with outdated cost parameters."""
+    return not stored.startswith(f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}$")
+
+
+# === Bounded execution ===
+_pool = ThreadPoolExecutor(max_workers=KDF_WORKERS, thread_name_prefix='kdf')
+# Running + queued hashes; beyond this, callers get KDFBusy instead of piling up
+_slots = threading.BoundedSemaphore(KDF_WORKERS * 2)
+
+def _run(fn, *args):
+    if not _slots.acquire(timeout=KDF_WAIT_S):
+        raise KDFBusy("Too many concurrent password hashes")
+    try:
+        return _pool.submit(fn, *args).result()
+    finally:
+        _slots.release()
+
+
+# === Verification cache ===
+_cache_key = os.urandom(32)
+_verified = OrderedDict()
+_verified_lock = threading.Lock()
+
+def _cache_token(password, stored):
+    return hashlib.blake2b(f"{stored}\0{password}".encode(), key=_cache_key, digest_size=32).digest()
+
+def _cached(token):
+    with _verified_lock:
+        expires = _verified.get(token)
+        if expires is None:
+            return False
+        if expires < time.monotonic():
+            del _verified[token]
+            return False
+        return True
+
+def _remember(token):
+    with _verified_lock:
+        _verified[token] = time.monotonic() + VERIFY_CACHE_TTL
+        _verified.move_to_end(token)
+        while len(_verified) > VERIFY_CACHE_SIZE:
+            _verified.popitem(last=False)
+
+
+# === Public API ===
+def hash_password(password):
+    return _run(_hash, password)
+
+def verify_password(password, stored):
+    token = _cache_token(password, stored)
+    if VERIFY_CACHE_TTL > 0 and _cached(token):
+        return True
+    ok = _run(_verify, password, stored)
+    if ok and VERIFY_CACHE_TTL > 0:
+        _remember(token)
+    return ok
+
+_dummy_hash = None
+_dummy_lock = threading.Lock()
+
+def _dummy_verify(password):
+    # Created on first use inside the pool, so even that first hash counts against the bound
+    global _dummy_hash
+    with _dummy_lock:
+        if _dummy_hash is None:
+            _dummy_hash = _hash('dummy-password')
+    return _verify(password, _dummy_hash)
+
+def dummy_verify(password):
+    """Spend the same time as a real check so unknown usernames are not distinguishable."""
+    _run(_dummy_verify, password)
@@ -0,0 +1,242 @@
+"""Preprocessed dataset cache: resized uint8 images in memory-mapped .npy shards.
+
+    python dataset_cache.py build DATA_DIR CACHE_DIR [--size 224] [--shard-size 2048]
+    python dataset_cache.py info CACHE_DIR
+
+`build` decodes each image once. Re-running it only decodes files whose content
+hash changed or that are new; their rows go into a new shard and the stale
+rows are dropped from the index. Readers np.load the shards with mmap_mode='r',
+so every training or evaluation process shares one page-cached copy.
+"""
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from input_pipeline import IMAGE_EXTENSIONS, VALIDATION_SPLIT
+from preprocessing import decode
+
+MANIFEST = 'manifest.json'
+SHARD_SIZE = 2048
+WORKERS = os.cpu_count() or 1
+
+
+def _sha1(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def _scan(data_dir):
+    """(class_names, {relpath: label}) with flow_from_directory's ordering."""
+    class_names = sorted(d for d in os.listdir(data_dir) if os.path.isdir(os.path.join(data_dir, d)))
+    files = {}
+    for label, name in enumerate(class_names):
+        for root, _, names in sorted(os.walk(os.path.join(data_dir, name)), key=lambda w: w[0]):
+            for f in sorted(names):
+                if f.lower().endswith(IMAGE_EXTENSIONS):
+                    files[os.path.relpath(os.path.join(root, f), data_dir)] = label
+    return class_names, files
+
+def load_manifest(cache_dir):
+    path = os.path.join(cache_dir, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def _write_manifest(cache_dir, manifest):
+    tmp = os.path.join(cache_dir, MANIFEST + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp, os.path.join(cache_dir, MANIFEST))
+
+
+# === Build ===
+def build(data_dir, cache_dir, img_size=(224, 224), shard_size=SHARD_SIZE, workers=WORKERS):
+    """Create or update the shard set; returns counts of added/reused/removed images."""
+    os.makedirs(cache_dir, exist_ok=True)
+    class_names, files = _scan(data_dir)
+    manifest = load_manifest(cache_dir)
+    if manifest and (tuple(manifest['img_size']) != tuple(img_size) or manifest['class_names'] != class_names):
+        # Incompatible: start over, without leaving the old shards behind
+        for name in manifest['shards']:
+            if os.path.exists(os.path.join(cache_dir, name)):
+                os.remove(os.path.join(cache_dir, name))
+        manifest = None
+    if manifest is None:
+        manifest = {'img_size': list(img_size), 'class_names': class_names, 'shards': [],
+                    'next_shard': 0, 'entries': {}}
+    old = manifest['entries']
+    order = {rel: i for i, rel in enumerate(files)}
+
+    # Cheap stat check first, content hash only when size/mtime moved
+    def fingerprint(rel):
+        st = os.stat(os.path.join(data_dir, rel))
+        entry = old.get(rel)
+        if entry and entry['size'] == st.st_size and entry['mtime_ns'] == st.st_mtime_ns:
+            return rel, entry['sha1'], st
+        return rel, _sha1(os.path.join(data_dir, rel)), st
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        scanned = list(pool.map(fingerprint, files))
+
+    entries, todo = {}, []
+    for rel, sha1, st in scanned:
+        entry = old.get(rel)
+        if entry and entry['sha1'] == sha1:
+            entries[rel] = dict(entry, size=st.st_size, mtime_ns=st.st_mtime_ns,
+                                label=files[rel], order=order[rel])
+        else:
+            todo.append((rel, sha1, st))
+
+    w, h = img_size
+    for start in range(0, len(todo), shard_size):
+        chunk = todo[start:start + shard_size]
+        shard_name = f"shard_{manifest['next_shard']:05d}.npy"
+        manifest['next_shard'] += 1
+        shard = np.lib.format.open_memmap(os.path.join(cache_dir, shard_name), mode='w+',
+                                          dtype=np.uint8, shape=(len(chunk), h, w, 3))
+
+        def load(i):
+            rel = chunk[i][0]
+            shard[i] = np.asarray(decode(os.path.join(data_dir, rel), img_size, draft=False))
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(load, range(len(chunk))))
+        shard.flush()
+        del shard
+        manifest['shards'].append(shard_name)
+        for i, (rel, sha1, st) in enumerate(chunk):
+            entries[rel] = {'shard': shard_name, 'row': i, 'label': files[rel], 'order': order[rel],
+                            'sha1': sha1, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+    removed = len(set(old) - set(entries))
+    replaced = len([r for r, _, _ in todo if r in old])
+    # Drop shards no entry points at any more
+    live = {e['shard'] for e in entries.values()}
+    for name in manifest['shards']:
+        if name not in live and os.path.exists(os.path.join(cache_dir, name)):
+            os.remove(os.path.join(cache_dir, name))
+    manifest['shards'] = [s for s in manifest['shards'] if s in live]
+    manifest['entries'] = entries
+    _write_manifest(cache_dir, manifest)
+    return {'images': len(entries), 'decoded': len(todo), 'reused': len(entries) - len(todo),
+            'replaced': replaced, 'removed': removed, 'shards': len(manifest['shards'])}
+
+
+# === Read ===
+class ShardedDataset:
+    """Read-only view over a shard set; `images(i)` slices without copying where possible."""
+
+    def __init__(self, cache_dir):
+        manifest = load_manifest(cache_dir)
+        if manifest is None:
+            raise FileNotFoundError(f"No dataset cache in {cache_dir}; run `python dataset_cache.py build` first")
+        self.class_names = manifest['class_names']
+        self.img_size = tuple(manifest['img_size'])
+        self._shards = [np.load(os.path.join(cache_dir, name), mmap_mode='r') for name in manifest['shards']]
+        shard_ids = {name: i for i, name in enumerate(manifest['shards'])}
+        # Same order as flow_from_directory (class, then os.walk order) so splits match
+        rels = sorted(manifest['entries'], key=lambda r: manifest['entries'][r]['order'])
+        self.paths = rels
+        self.labels = np.array([manifest['entries'][r]['label'] for r in rels], dtype=np.int64)
+        self.shard = np.array([shard_ids[manifest['entries'][r]['shard']] for r in rels], dtype=np.int64)
+        self.row = np.array([manifest['entries'][r]['row'] for r in rels], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def split(self, validation_split=VALIDATION_SPLIT):
+        """(train_indices, val_indices): first fraction of each class is validation, as in input_pipeline."""
+        train, val = [], []
+        for label in range(len(self.class_names)):
+            idx = np.flatnonzero(self.labels == label)
+            cut = int(validation_split * len(idx))
+            val.append(idx[:cut])
+            train.append(idx[cut:])
+        return np.concatenate(train), np.concatenate(val)
+
+    def images(self, indices):
+        """uint8 (N, H, W, 3) for `indices`. A run inside one shard is a zero-copy view."""
+        indices = np.asarray(indices)
+        shards = self.shard[indices]
+        rows = self.row[indices]
+        if len(indices) and (shards == shards[0]).all() and (np.diff(rows) == 1).all():
+            return self._shards[shards[0]][rows[0]:rows[-1] + 1]
+        out = np.empty((len(indices),) + self._shards[0].shape[1:], dtype=np.uint8)
+        for s in np.unique(shards):
+            mask = shards == s
+            out[mask] = self._shards[s][rows[mask]]
+        return out
+
+    def iter_batches(self, indices, batch_size, shuffle=False, seed=None):
+        indices = np.asarray(indices)
+        if shuffle:
+            indices = np.random.default_rng(seed).permutation(indices)
+        for start in range(0, len(indices), batch_size):
+            batch = indices[start:start + batch_size]
+            yield self.images(batch), self.labels[batch]
+
+    def tf_dataset(self, indices, batch_size, training=False, seed=None):
+        """Batched (float images, one-hot labels) tf.data pipeline over the shards."""
+        import tensorflow as tf
+        from input_pipeline import _augmenter
+        h, w = self.img_size[1], self.img_size[0]
+        n = len(self.class_names)
+        epoch = [0]
+
+        def gen():
+            epoch[0] += 1
+            yield from self.iter_batches(indices, batch_size, shuffle=training,
+                                         seed=None if seed is None else seed + epoch[0])
+
+        ds = tf.data.Dataset.from_generator(gen, output_signature=(
+            tf.TensorSpec((None, h, w, 3), tf.uint8), tf.TensorSpec((None,), tf.int64)))
+        augment = _augmenter() if training else None
+
+        def finish(images, label):
+            images = tf.cast(images, tf.float32) / 255.0
+            if augment is not None:
+                images = augment(images, training=True)
+            return images, tf.one_hot(label, n)
+
+        return ds.map(finish, num_parallel_calls=tf.data.AUTOTUNE).prefetch(tf.data.AUTOTUNE)
+
+def make_datasets(cache_dir, batch_size, validation_split=VALIDATION_SPLIT, seed=42):
+    """Drop-in for input_pipeline.make_datasets reading from a built shard set."""
+    data = ShardedDataset(cache_dir)
+    train_idx, val_idx = data.split(validation_split)
+    return (data.tf_dataset(train_idx, batch_size, training=True, seed=seed),
+            data.tf_dataset(val_idx, batch_size), data.class_names)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or inspect the memory-mapped dataset cache")
+    sub = parser.add_subparsers(dest='command', required=True)
+    b = sub.add_parser('build')
+    b.add_argument('data_dir')
+    b.add_argument('cache_dir')
+    b.add_argument('--size', type=int, default=224)
+    b.add_argument('--shard-size', type=int, default=SHARD_SIZE)
+    b.add_argument('--workers', type=int, default=WORKERS)
+    i = sub.add_parser('info')
+    i.add_argument('cache_dir')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        print(json.dumps(build(args.data_dir, args.cache_dir, (args.size, args.size),
+                               args.shard_size, args.workers), indent=2))
+    else:
+        data = ShardedDataset(args.cache_dir)
+        counts = np.bincount(data.labels, minlength=len(data.class_names))
+        print(json.dumps({'images': len(data), 'img_size': data.img_size, 'shards': len(data._shards),
+                          'per_class': dict(zip(data.class_names, counts.tolist()))}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
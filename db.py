@@ -0,0 +1,85 @@
+import os
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+
+DB_PATH = os.environ.get('DATABASE_PATH', 'users.db')
+BUSY_TIMEOUT_MS = int(os.environ.get('DATABASE_BUSY_TIMEOUT_MS', 5000))
+# Idle connections kept per database file; extra ones opened under a burst are closed on return
+POOL_SIZE = int(os.environ.get('DATABASE_POOL_SIZE', 8))
+# sqlite3 keeps this many compiled statements per connection; reusing the same SQL text hits it
+STATEMENT_CACHE = 256
+
+_idle = {}  # path -> [connection, ...], most recently returned last
+_all = weakref.WeakSet()  # every open connection, checked out or idle, for close_all
+_lock = threading.Lock()
+_generation = 0
+
+
+class _Connection(sqlite3.Connection):
+    """sqlite3.Connection itself can't be weakly referenced."""
+
+
+def _open(path):
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000.0, factory=_Connection,
+                           cached_statements=STATEMENT_CACHE, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    # WAL lets readers run alongside the single writer instead of taking the whole file lock
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+@contextmanager
+def connection(path=None):
+    """Check a pooled connection to `path` out for the duration of the block."""
+    path = path or DB_PATH
+    with _lock:
+        idle = _idle.get(path)
+        conn = idle.pop() if idle else None
+        generation = _generation
+    if conn is None:
+        conn = _open(path)
+        with _lock:
+            _all.add(conn)
+    try:
+        yield conn
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        with _lock:
+            idle = _idle.setdefault(path, [])
+            keep = generation == _generation and len(idle) < POOL_SIZE
+            if keep:
+                idle.append(conn)
+            else:
+                _all.discard(conn)
+        if not keep:
+            conn.close()
+
+@contextmanager
+def transaction(path=None):
+    """Commit on success, roll back on error."""
+    with connection(path) as conn:
+        with conn:
+            yield conn
+
+def query_one(sql, args=(), path=None):
+    with connection(path) as conn:
+        return conn.execute(sql, args).fetchone()
+
+def query_all(sql, args=(), path=None):
+    with connection(path) as conn:
+        return conn.execute(sql, args).fetchall()
+
+def close_all():
+    """Close every connection; checked-out ones are not returned to the pool."""
+    global _generation
+    with _lock:
+        _generation += 1
+        conns = list(_all)
+        _all.clear()
+        _idle.clear()
+    for conn in conns:
+        conn.close()
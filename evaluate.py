@@ -0,0 +1,276 @@
+"""Offline evaluation on a labelled folder laid out as <class>/<image>.
+
+    python evaluate.py DATA_DIR [--model rice_disease_model.h5] [--compare OTHER_MODEL]
+                       [--json eval_report.json] [--html eval_report.html]
+    python evaluate.py --shards CACHE_DIR [--subset val] ...
+
+Images are decoded with the same preprocessing as predict_disease into two
+reusable batch buffers, so memory stays at two batches of pixels plus one
+float32 probability row per image and model, whatever the folder size. When
+--compare is given every batch is decoded once and run through both models.
+With --shards the images come pre-decoded from a dataset_cache.py shard set
+(all of it, or the same train/val split training used) instead.
+"""
+import argparse
+import html
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from bulk_predict import _chunks, _is_image
+from preprocessing import BatchBuffer, IMG_SIZE
+
+BATCH_SIZE = 64
+WORKERS = min(8, os.cpu_count() or 1)
+ECE_BINS = 15
+
+
+# === Data ===
+def list_labeled(data_dir, class_names):
+    """(files, labels) for sub-folders named after a class; other folders are reported and skipped."""
+    files, labels, skipped = [], [], []
+    for folder in sorted(os.listdir(data_dir)):
+        root = os.path.join(data_dir, folder)
+        if not os.path.isdir(root):
+            continue
+        if folder not in class_names:
+            skipped.append(folder)
+            continue
+        label = class_names.index(folder)
+        for dirpath, dirs, names in os.walk(root):
+            dirs.sort()
+            for name in sorted(names):
+                if _is_image(name):
+                    files.append(os.path.join(dirpath, name))
+                    labels.append(label)
+    if skipped:
+        print(f"[Warning] Skipping folders that are not known classes: {skipped}")
+    return files, np.asarray(labels, dtype=np.int64)
+
+def _decode_into(buf, index, path):
+    try:
+        buf.load(index, path)
+        return True
+    except Exception as e:
+        print(f"[Warning] Skipping {path}: {e}")
+        return False
+
+def predict_files(models, files, num_classes, batch_size=BATCH_SIZE, workers=WORKERS):
+    """Run every model over `files`; returns ({name: (N, C) float32 probs}, decoded mask)."""
+    probs = {name: np.zeros((len(files), num_classes), dtype=np.float32) for name in models}
+    decoded = np.zeros(len(files), dtype=bool)
+    buffers = [BatchBuffer(batch_size), BatchBuffer(batch_size)]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        def start(chunk, buf):
+            if chunk is None:
+                return None
+            return chunk, buf, [pool.submit(_decode_into, buf, i, path) for i, (_, path) in enumerate(chunk)]
+
+        # Decoding of the next chunk overlaps with inference on the current one
+        chunks = _chunks(enumerate(files), batch_size)
+        current = start(next(chunks, None), buffers[0])
+        turn = 1
+        while current is not None:
+            chunk, buf, futures = current
+            ok = np.array([f.result() for f in futures])
+            current = start(next(chunks, None), buffers[turn])
+            turn ^= 1
+
+            rows = np.array([i for i, _ in chunk])[ok]
+            if not len(rows):
+                continue
+            batch = buf.normalized(len(chunk))[ok]
+            decoded[rows] = True
+            for name, model in models.items():
+                probs[name][rows] = model.predict(batch)
+    return probs, decoded
+
+def predict_shards(models, cache_dir, class_names, subset='all', batch_size=BATCH_SIZE):
+    """Like predict_files over a shard set; returns ({name: probs}, labels in `class_names` order)."""
+    from dataset_cache import ShardedDataset
+    data = ShardedDataset(cache_dir)
+    if tuple(data.img_size) != tuple(IMG_SIZE):
+        raise ValueError(f"Shards in {cache_dir} are {data.img_size}, the model expects {IMG_SIZE}")
+    if subset == 'all':
+        indices = np.arange(len(data))
+    else:
+        train, val = data.split()
+        indices = val if subset == 'val' else train
+    # Shard labels index the shard set's own class list
+    mapping = np.array([class_names.index(n) if n in class_names else -1 for n in data.class_names], dtype=np.int64)
+    skipped = [n for n in data.class_names if n not in class_names]
+    if skipped:
+        print(f"[Warning] Skipping classes that are not known classes: {skipped}")
+    indices = indices[mapping[data.labels[indices]] >= 0]
+    probs = {name: np.zeros((len(indices), len(class_names)), dtype=np.float32) for name in models}
+    out = np.empty((batch_size, data.img_size[1], data.img_size[0], 3), dtype=np.float32)
+    start = 0
+    for images, _ in data.iter_batches(indices, batch_size):
+        batch = out[:len(images)]
+        np.multiply(images, np.float32(1 / 255), out=batch, casting='unsafe')
+        for name, model in models.items():
+            probs[name][start:start + len(images)] = model.predict(batch)
+        start += len(images)
+    return probs, mapping[data.labels[indices]]
+
+
+# === Metrics ===
+def confusion_matrix(labels, preds, num_classes):
+    """Rows are true classes, columns predicted classes."""
+    return np.bincount(labels * num_classes + preds, minlength=num_classes ** 2).reshape(num_classes, num_classes)
+
+def _ratio(a, b):
+    return np.divide(a, b, out=np.zeros(len(a), dtype=np.float64), where=b > 0)
+
+def per_class_metrics(cm):
+    tp = np.diag(cm).astype(np.float64)
+    precision = _ratio(tp, cm.sum(axis=0))
+    recall = _ratio(tp, cm.sum(axis=1))
+    f1 = _ratio(2 * precision * recall, precision + recall)
+    return precision, recall, f1, cm.sum(axis=1)
+
+def calibration(probs, labels, bins=ECE_BINS):
+    """Expected calibration error over equal-width confidence bins, plus the reliability table."""
+    confidence = probs.max(axis=1)
+    correct = (probs.argmax(axis=1) == labels).astype(np.float64)
+    bucket = np.minimum((confidence * bins).astype(np.int64), bins - 1)
+    count = np.bincount(bucket, minlength=bins)
+    conf_sum = np.bincount(bucket, weights=confidence, minlength=bins)
+    acc_sum = np.bincount(bucket, weights=correct, minlength=bins)
+    ece = float(np.abs(acc_sum - conf_sum).sum() / max(len(labels), 1))
+    table = [{'bin': f"{i / bins:.2f}-{(i + 1) / bins:.2f}", 'count': int(count[i]),
+              'confidence': round(conf_sum[i] / count[i], 4), 'accuracy': round(acc_sum[i] / count[i], 4)}
+             for i in range(bins) if count[i]]
+    return ece, table
+
+def summarize(probs, labels, class_names, bins=ECE_BINS):
+    n = len(class_names)
+    preds = probs.argmax(axis=1)
+    cm = confusion_matrix(labels, preds, n)
+    precision, recall, f1, support = per_class_metrics(cm)
+    ece, reliability = calibration(probs, labels, bins)
+    return {
+        'images': int(len(labels)),
+        'accuracy': round(float(np.mean(preds == labels)), 4) if len(labels) else None,
+        'macro_f1': round(float(f1[support > 0].mean()), 4) if support.any() else None,
+        'ece': round(ece, 4),
+        'per_class': {name: {'precision': round(float(precision[i]), 4), 'recall': round(float(recall[i]), 4),
+                             'f1': round(float(f1[i]), 4), 'support': int(support[i])}
+                      for i, name in enumerate(class_names)},
+        'confusion_matrix': cm.tolist(),
+        'reliability': reliability,
+    }
+
+def compare(probs_a, probs_b, labels):
+    pred_a, pred_b = probs_a.argmax(axis=1), probs_b.argmax(axis=1)
+    right_a, right_b = pred_a == labels, pred_b == labels
+    return {
+        'top1_agreement': round(float(np.mean(pred_a == pred_b)), 4) if len(labels) else None,
+        'only_a_correct': int((right_a & ~right_b).sum()),
+        'only_b_correct': int((right_b & ~right_a).sum()),
+        'max_abs_prob_diff': round(float(np.abs(probs_a - probs_b).max()), 6) if len(labels) else None,
+    }
+
+
+# === Report ===
+def evaluate(data_dir, model_paths, class_names, batch_size=BATCH_SIZE, workers=WORKERS, bins=ECE_BINS,
+             shards=None, subset='all'):
+    """Report for a labelled folder, or for a shard set when `shards` (a cache dir) is given."""
+    from inference_backends import backend_for_path, load_backend
+    models = {path: load_backend(backend_for_path(path), path) for path in model_paths}
+    started = time.perf_counter()
+    if shards:
+        probs, labels = predict_shards(models, shards, class_names, subset, batch_size)
+        found, failed = len(labels), 0
+    else:
+        files, labels = list_labeled(data_dir, class_names)
+        probs, decoded = predict_files(models, files, len(class_names), batch_size, workers)
+        probs = {name: p[decoded] for name, p in probs.items()}
+        labels = labels[decoded]
+        found, failed = len(files), int((~decoded).sum())
+    seconds = time.perf_counter() - started
+    report = {
+        'data_dir': f"{shards} ({subset} shards)" if shards else data_dir,
+        'class_names': list(class_names),
+        'images_found': found,
+        'images_failed': failed,
+        'images_per_s': round(found / seconds, 1) if seconds else None,
+        'models': {path: summarize(probs[path], labels, class_names, bins) for path in model_paths},
+    }
+    if len(model_paths) == 2:
+        a, b = model_paths
+        report['comparison'] = dict(compare(probs[a], probs[b], labels), a=a, b=b)
+    return report
+
+def _table(header, rows):
+    head = ''.join(f"<th>{html.escape(str(h))}</th>" for h in header)
+    body = ''.join('<tr>' + ''.join(f"<td>{html.escape(str(c))}</td>" for c in row) + '</tr>' for row in rows)
+    return f"<table><tr>{head}</tr>{body}</table>"
+
+def render_html(report):
+    names = report['class_names']
+    parts = [f"<h1>Evaluation: {html.escape(report['data_dir'])}</h1>",
+             f"<p>{report['images_found']} images, {report['images_failed']} unreadable</p>"]
+    for path, m in report['models'].items():
+        parts.append(f"<h2>{html.escape(path)}</h2>")
+        parts.append(f"<p>Accuracy {m['accuracy']} &middot; macro F1 {m['macro_f1']} &middot; ECE {m['ece']}</p>")
+        parts.append(_table(['class', 'precision', 'recall', 'f1', 'support'],
+                            [[n] + [m['per_class'][n][k] for k in ('precision', 'recall', 'f1', 'support')]
+                             for n in names]))
+        parts.append("<h3>Confusion matrix (rows: true, columns: predicted)</h3>")
+        parts.append(_table([''] + names, [[n] + row for n, row in zip(names, m['confusion_matrix'])]))
+        parts.append("<h3>Reliability</h3>")
+        parts.append(_table(['confidence bin', 'count', 'mean confidence', 'accuracy'],
+                            [[r['bin'], r['count'], r['confidence'], r['accuracy']] for r in m['reliability']]))
+    if 'comparison' in report:
+        c = report['comparison']
+        parts.append("<h2>Comparison</h2>")
+        parts.append(_table(['metric', 'value'], [[k, v] for k, v in c.items()]))
+    style = "table{border-collapse:collapse;margin:8px 0}td,th{border:1px solid #ccc;padding:2px 6px;text-align:right}"
+    return f"<!DOCTYPE html><html><head><meta charset='utf-8'><style>{style}</style></head><body>{''.join(parts)}</body></html>"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate model files on a labelled image folder")
+    parser.add_argument('data_dir', nargs='?', help="Folder with one sub-folder per class")
+    parser.add_argument('--shards', help="Read pre-decoded images from this dataset_cache.py shard set instead")
+    parser.add_argument('--subset', choices=['all', 'train', 'val'], default='all',
+                        help="Part of the shard set to evaluate (train/val: the split training used)")
+    parser.add_argument('--model', help="Model file (default: MODEL_PATH / the configured backend's artifact)")
+    parser.add_argument('--compare', help="Second model file evaluated side by side")
+    parser.add_argument('--labels', default='class_labels.txt')
+    parser.add_argument('-b', '--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('-w', '--workers', type=int, default=WORKERS)
+    parser.add_argument('--bins', type=int, default=ECE_BINS, help="Confidence bins for ECE")
+    parser.add_argument('--json', default='eval_report.json')
+    parser.add_argument('--html', help="Also write an HTML report")
+    args = parser.parse_args(argv)
+    if bool(args.data_dir) == bool(args.shards):
+        parser.error("give either DATA_DIR or --shards CACHE_DIR")
+
+    with open(args.labels) as f:
+        class_names = [line.strip() for line in f if line.strip()]
+    if args.model is None:
+        from utils import MODEL_PATH
+        args.model = MODEL_PATH
+    paths = [args.model] + ([args.compare] if args.compare else [])
+
+    report = evaluate(args.data_dir, paths, class_names, args.batch_size, args.workers, args.bins,
+                      args.shards, args.subset)
+    with open(args.json, 'w') as f:
+        json.dump(report, f, indent=2)
+    if args.html:
+        with open(args.html, 'w') as f:
+            f.write(render_html(report))
+    for path, m in report['models'].items():
+        print(f"{path}: accuracy={m['accuracy']} macro_f1={m['macro_f1']} ece={m['ece']} ({m['images']} images)")
+    if 'comparison' in report:
+        print(json.dumps(report['comparison'], indent=2))
+
+
+if __name__ == '__main__':
+    main()
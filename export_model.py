@@ -0,0 +1,160 @@
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+import metrics
+from bulk_predict import iter_sources
+from inference_backends import DEFAULT_ARTIFACTS
+
+KERAS_MODEL = DEFAULT_ARTIFACTS['keras']
+CALIBRATION_SAMPLES = 200
+
+
+# === Export ===
+def _load_images(directory, limit=None):
+    from utils import preprocess_image
+    arrays, names = [], []
+    for name, read in iter_sources(directory):
+        try:
+            arrays.append(preprocess_image(io.BytesIO(read())))
+            names.append(name)
+        except Exception as e:
+            print(f"[Warning] Skipping {name}: {e}")
+        if limit and len(arrays) >= limit:
+            break
+    return names, arrays
+
+def export_tflite(model, path, quantize=None, calibration_dir=None):
+    import tensorflow as tf
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantize == 'float16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantize == 'int8':
+        if not calibration_dir:
+            raise ValueError("int8 quantization needs a calibration image folder")
+        _, samples = _load_images(calibration_dir, limit=CALIBRATION_SAMPLES)
+
+        def representative_dataset():
+            for sample in samples:
+                yield [sample[np.newaxis]]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.uint8
+        converter.inference_output_type = tf.uint8
+    elif quantize:
+        raise ValueError(f"Unknown quantization mode: {quantize}")
+    with open(path, 'wb') as f:
+        f.write(converter.convert())
+    return path
+
+def export_onnx(model, path, opset=13):
+    import tensorflow as tf
+    import tf2onnx
+    spec = (tf.TensorSpec((None,) + tuple(model.input_shape[1:]), tf.float32, name='input'),)
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=opset, output_path=path)
+    return path
+
+def export(model, fmt, path=None, quantize=None, calibration_dir=None):
+    path = path or DEFAULT_ARTIFACTS[fmt]
+    if fmt == 'tflite':
+        export_tflite(model, path, quantize=quantize, calibration_dir=calibration_dir)
+    elif fmt == 'onnx':
+        if quantize:
+            raise ValueError("Quantized export is only supported for tflite")
+        export_onnx(model, path)
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+    print(f"Exported {fmt} model to {path} ({os.path.getsize(path) / 1e6:.2f} MB)")
+    return path
+
+
+# === Parity and latency report ===
+def _measure(backend, path, directory, repeats):
+    # Runs in a fresh process so RSS reflects only this backend
+    from inference_backends import load_backend
+    started = time.perf_counter()
+    model = load_backend(backend, path)
+    load_s = time.perf_counter() - started
+    names, arrays = _load_images(directory)
+    probs = np.concatenate([model.predict(a[np.newaxis]) for a in arrays]) if arrays else np.zeros((0, 0))
+    latencies = []
+    for a in arrays[:repeats]:
+        t = time.perf_counter()
+        model.predict(a[np.newaxis])
+        latencies.append((time.perf_counter() - t) * 1000)
+    peak = metrics.peak_resident_memory_bytes()
+    return {
+        'names': names,
+        'probs': probs.tolist(),
+        'load_s': round(load_s, 4),
+        'latency_ms_p50': round(float(np.percentile(latencies, 50)), 3) if latencies else None,
+        'latency_ms_p95': round(float(np.percentile(latencies, 95)), 3) if latencies else None,
+        'max_rss_mb': round(peak / 2 ** 20, 1) if peak is not None else None,
+        'artifact_mb': round(os.path.getsize(path) / 1e6, 3),
+    }
+
+def compare(artifacts, directory, repeats=50):
+    """artifacts: {backend: path}; the keras entry is the reference."""
+    ctx = multiprocessing.get_context('spawn')
+    results = {}
+    for backend, path in artifacts.items():
+        with ctx.Pool(1) as pool:
+            results[backend] = pool.apply(_measure, (backend, path, directory, repeats))
+
+    from utils import CLASS_NAMES
+    names = results['keras']['names']
+    reference = np.asarray(results['keras']['probs'])
+    # Folders laid out as <class>/<image> also get a true accuracy figure
+    folders = [n.replace('\\', '/').split('/')[0] for n in names]
+    labels = np.array([CLASS_NAMES.index(c) for c in folders]) if names and all(c in CLASS_NAMES for c in folders) else None
+
+    report = {'images': len(names), 'backends': {}}
+    for backend, r in results.items():
+        probs = np.asarray(r['probs'])
+        entry = {k: v for k, v in r.items() if k not in ('names', 'probs')}
+        if len(reference):
+            entry['top1_agreement'] = round(float(np.mean(probs.argmax(1) == reference.argmax(1))), 4)
+            entry['max_abs_prob_diff'] = round(float(np.abs(probs - reference).max()), 6)
+        if labels is not None:
+            entry['accuracy'] = round(float(np.mean(probs.argmax(1) == labels)), 4)
+        report['backends'][backend] = entry
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the Keras model for TensorFlow-free CPU serving")
+    parser.add_argument('--model', default=KERAS_MODEL)
+    parser.add_argument('--format', choices=['tflite', 'onnx'], default='tflite')
+    parser.add_argument('--quantize', choices=['float16', 'int8'])
+    parser.add_argument('--output', help="Artifact path (default depends on format)")
+    parser.add_argument('--calibration-dir', help="Images used to calibrate int8 quantization")
+    parser.add_argument('--validate-dir', help="Labelled or unlabelled image folder for the parity check")
+    parser.add_argument('--min-agreement', type=float, default=0.99)
+    parser.add_argument('--report', default='backend_report.json')
+    args = parser.parse_args(argv)
+
+    from tensorflow.keras.models import load_model
+    path = export(load_model(args.model), args.format, args.output,
+                  quantize=args.quantize, calibration_dir=args.calibration_dir)
+    if not args.validate_dir:
+        return
+
+    report = compare({'keras': args.model, args.format: path}, args.validate_dir)
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    agreement = report['backends'][args.format].get('top1_agreement', 1.0)
+    if agreement < args.min_agreement:
+        raise SystemExit(f"Parity check failed: top-1 agreement {agreement} < {args.min_agreement}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+import json
+import os
+import sqlite3
+import threading
+
+import db
+
+FLUSH_INTERVAL = float(os.environ.get('HISTORY_FLUSH_MS', 50)) / 1000.0
+FLUSH_BATCH = int(os.environ.get('HISTORY_FLUSH_BATCH', 100))
+MAX_PAGE_SIZE = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    id TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    filename TEXT,
+    disease TEXT NOT NULL,
+    confidence REAL,
+    probs TEXT,
+    created TEXT NOT NULL,
+    image TEXT,
+    quality TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_predictions_user_created ON predictions(username, created);
+CREATE INDEX IF NOT EXISTS idx_predictions_created ON predictions(created);
+CREATE INDEX IF NOT EXISTS idx_predictions_disease ON predictions(disease);
+"""
+
+
+class HistoryStore:
+    """Prediction history in users.db.
+
+    add() writes the row before returning, so any worker process can read it right
+    away (e.g. /result landing on another worker). add_many() is for bulk callers:
+    rows are buffered and flushed by a background thread with executemany, so a
+    burst costs one transaction, and this process' reads see them immediately.
+    """
+
+    def __init__(self, db_path=None, flush_interval=FLUSH_INTERVAL, flush_batch=FLUSH_BATCH):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+            # Older tables lack the stored image name (content-addressed uploads) and quality flags
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(predictions)")}
+            for column in ('image', 'quality'):
+                if column not in columns:
+                    try:
+                        conn.execute(f"ALTER TABLE predictions ADD COLUMN {column} TEXT")
+                    except sqlite3.OperationalError:
+                        pass  # another worker process added it first
+        self._writer = threading.Thread(target=self._flush_loop, name='history-writer', daemon=True)
+        self._writer.start()
+
+    def _conn(self):
+        return db.connection(self.db_path)
+
+    # === Writes ===
+    def add(self, prediction):
+        # One INSERT on a pooled WAL connection; cheap enough for the interactive path
+        self._insert([prediction])
+
+    def add_many(self, predictions):
+        with self._lock:
+            for p in predictions:
+                self._pending[p['id']] = p
+            full = len(self._pending) >= self.flush_batch
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        with self._lock:
+            rows = list(self._pending.values())
+        if not rows:
+            return 0
+        self._insert(rows)
+        with self._lock:
+            for p in rows:
+                if self._pending.get(p['id']) is p:
+                    del self._pending[p['id']]
+        return len(rows)
+
+    def _insert(self, rows):
+        with db.transaction(self.db_path) as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO predictions "
+                "(id, username, filename, disease, confidence, probs, created, image, quality) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(p['id'], p['username'], p.get('filename'), p['disease'], p['confidence'],
+                  json.dumps(p.get('values')), p['created'], p.get('image'),
+                  json.dumps(p['quality']) if p.get('quality') else None) for p in rows])
+
+    def _flush_loop(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"[Warning] Could not write prediction history: {e}")
+
+    # === Reads ===
+    @staticmethod
+    def _row(row):
+        return {
+            'id': row['id'],
+            'username': row['username'],
+            'filename': row['filename'],
+            'disease': row['disease'],
+            'confidence': row['confidence'],
+            'values': json.loads(row['probs']) if row['probs'] else [],
+            'created': row['created'],
+            'image': row['image'],
+            'quality': json.loads(row['quality']) if row['quality'] else None,
+        }
+
+    def get(self, prediction_id):
+        with self._lock:
+            if prediction_id in self._pending:
+                return dict(self._pending[prediction_id])
+        with self._conn() as conn:
+            row = conn.execute("SELECT * FROM predictions WHERE id=?", (prediction_id,)).fetchone()
+        return self._row(row) if row else None
+
+    def page(self, username, page=1, per_page=20):
+        self.flush()
+        per_page = max(1, min(int(per_page), MAX_PAGE_SIZE))
+        page = max(1, int(page))
+        with self._conn() as conn:
+            total = conn.execute("SELECT COUNT(*) FROM predictions WHERE username=?", (username,)).fetchone()[0]
+            rows = conn.execute(
+                "SELECT id, username, filename, disease, confidence, NULL AS probs, created, image, quality "
+                "FROM predictions "
+                "WHERE username=? ORDER BY created DESC, id DESC LIMIT ? OFFSET ?",
+                (username, per_page, (page - 1) * per_page)).fetchall()
+        return {'page': page, 'per_page': per_page, 'total': total,
+                'items': [self._row(r) for r in rows]}
+
+    def disease_counts(self, username=None, start=None, end=None, by_day=False):
+        """Counts per disease (and per day with by_day) for one user or everyone, within [start, end]."""
+        self.flush()
+        where, args = [], []
+        if username:
+            where.append("username=?")
+            args.append(username)
+        if start:
+            where.append("created >= ?")
+            args.append(start)
+        if end:
+            # A bare date includes the whole day
+            where.append("created <= ?")
+            args.append(end + ' 23:59:59' if len(end) == 10 else end)
+        clause = ("WHERE " + " AND ".join(where)) if where else ""
+        if by_day:
+            rows = db.query_all(
+                f"SELECT substr(created, 1, 10) AS day, disease, COUNT(*) AS n FROM predictions {clause} "
+                "GROUP BY day, disease ORDER BY day", args, self.db_path)
+            days = {}
+            for r in rows:
+                days.setdefault(r['day'], {})[r['disease']] = r['n']
+            return days
+        rows = db.query_all(
+            f"SELECT disease, COUNT(*) AS n FROM predictions {clause} GROUP BY disease ORDER BY n DESC",
+            args, self.db_path)
+        return {r['disease']: r['n'] for r in rows}
@@ -0,0 +1,127 @@
+import os
+import threading
+
+import numpy as np
+
+# Default artifact per backend; override with MODEL_PATH
+DEFAULT_ARTIFACTS = {
+    'keras': 'rice_disease_model.h5',
+    'tflite': 'rice_disease_model.tflite',
+    'onnx': 'rice_disease_model.onnx',
+}
+NUM_THREADS = int(os.environ.get('INFERENCE_THREADS', 0)) or None
+
+
+class KerasBackend:
+    name = 'keras'
+
+    def __init__(self, path):
+        from tensorflow.keras.models import load_model
+        self.model = load_model(path)
+
+    def predict(self, batch):
+        return self.model.predict(batch, verbose=0)
+
+
+class TFLiteBackend:
+    """Runs a .tflite file with tflite_runtime, falling back to tf.lite if that is all we have.
+
+    Resizing an interpreter's input reallocates all of its tensors, and the
+    micro-batcher and TTA send many different batch sizes, so there is one
+    interpreter per batch size seen (the model file itself is memory-mapped once).
+    """
+    name = 'tflite'
+
+    def __init__(self, path):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+        self._interpreter_class = Interpreter
+        self.path = path
+        self._interpreters = {}  # batch size -> (interpreter, input details, output details, lock)
+        self._lock = threading.Lock()
+        interpreter = Interpreter(model_path=path, num_threads=NUM_THREADS)
+        interpreter.allocate_tensors()
+        # Quantization parameters and dtypes are the same at every batch size
+        self.input = interpreter.get_input_details()[0]
+        self.output = interpreter.get_output_details()[0]
+        self._interpreters[int(self.input['shape'][0])] = (interpreter, self.input, self.output, threading.Lock())
+
+    def _for_batch(self, size):
+        entry = self._interpreters.get(size)
+        if entry is None:
+            with self._lock:
+                entry = self._interpreters.get(size)
+                if entry is None:
+                    interpreter = self._interpreter_class(model_path=self.path, num_threads=NUM_THREADS)
+                    interpreter.resize_tensor_input(self.input['index'], [size, *self.input['shape'][1:]])
+                    interpreter.allocate_tensors()
+                    entry = (interpreter, interpreter.get_input_details()[0],
+                             interpreter.get_output_details()[0], threading.Lock())
+                    self._interpreters[size] = entry
+        return entry
+
+    def _quantize(self, batch):
+        dtype = self.input['dtype']
+        if dtype == np.float32:
+            return batch.astype(np.float32, copy=False)
+        scale, zero_point = self.input['quantization']
+        return np.clip(np.round(batch / scale + zero_point),
+                       np.iinfo(dtype).min, np.iinfo(dtype).max).astype(dtype)
+
+    def _dequantize(self, out):
+        if self.output['dtype'] == np.float32:
+            return out
+        scale, zero_point = self.output['quantization']
+        return (out.astype(np.float32) - zero_point) * scale
+
+    def predict(self, batch):
+        interpreter, input_details, output_details, lock = self._for_batch(int(batch.shape[0]))
+        # Each interpreter is not thread-safe on its own
+        with lock:
+            interpreter.set_tensor(input_details['index'], self._quantize(batch))
+            interpreter.invoke()
+            return self._dequantize(interpreter.get_tensor(output_details['index']).copy())
+
+
+class OnnxBackend:
+    name = 'onnx'
+
+    def __init__(self, path):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if NUM_THREADS:
+            options.intra_op_num_threads = NUM_THREADS
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch):
+        return self.session.run(None, {self.input_name: batch.astype(np.float32, copy=False)})[0]
+
+
+def _remote_backend(socket_path):
+    # Model lives in a separate model_server.py process; see that module
+    from model_server import RemoteBackend
+    return RemoteBackend(socket_path)
+
+
+BACKENDS = {
+    'keras': KerasBackend,
+    'tflite': TFLiteBackend,
+    'onnx': OnnxBackend,
+    'remote': _remote_backend,
+}
+
+BACKEND_BY_EXTENSION = {'.h5': 'keras', '.keras': 'keras', '.tflite': 'tflite', '.onnx': 'onnx'}
+
+def backend_for_path(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in BACKEND_BY_EXTENSION:
+        raise ValueError(f"Cannot tell the backend of {path}; expected one of {sorted(BACKEND_BY_EXTENSION)}")
+    return BACKEND_BY_EXTENSION[ext]
+
+def load_backend(name, path=None):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{name}', expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name](path or DEFAULT_ARTIFACTS.get(name))
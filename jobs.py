@@ -0,0 +1,139 @@
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import metrics
+
+WORKERS = int(os.environ.get('JOB_WORKERS', 4))
+MAX_PENDING = int(os.environ.get('JOB_QUEUE_SIZE', 64))
+KEEP_FINISHED = int(os.environ.get('JOB_KEEP_FINISHED', 1000))
+
+
+class QueueFull(Exception):
+    pass
+
+
+class StageTimer:
+    """Records wall time per named stage, e.g. `with timer.stage('inference'): ...`."""
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            self.stages[name] = round(seconds, 4)
+            metrics.observe_stage(name, seconds)
+
+
+class Job(StageTimer):
+    def __init__(self, kind, owner, fn, args):
+        super().__init__()
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.owner = owner
+        self.fn = fn
+        self.args = args
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    def run(self):
+        self.started = time.time()
+        self.stages['queued'] = round(self.started - self.created, 4)
+        self.status = 'running'
+        try:
+            self.result = self.fn(self, *self.args)
+            self.status = 'done'
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            self.status = 'error'
+        finally:
+            self.finished = time.time()
+            self.stages['total'] = round(self.finished - self.created, 4)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'error': self.error,
+            'stages': dict(self.stages),
+        }
+
+
+class JobQueue:
+    """In-process job queue: a fixed worker pool fed by a bounded queue.
+
+    `submit` raises QueueFull instead of blocking, so callers can answer 429.
+    """
+
+    def __init__(self, workers=WORKERS, max_pending=MAX_PENDING, keep=KEEP_FINISHED):
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self.keep = keep
+        self.workers = workers
+        self.rejected = 0
+        self._threads = [threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True)
+                         for i in range(workers)]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, kind, owner, fn, *args, stages=None):
+        """Queue fn(job, *args) and return the Job immediately.
+
+        `stages` carries timings already recorded by the caller (e.g. the upload save).
+        """
+        job = Job(kind, owner, fn, args)
+        job.stages.update(stages or {})
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            raise QueueFull(f"{self._queue.maxsize} jobs already pending")
+        with self._lock:
+            self._jobs[job.id] = job
+            self._trim()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _trim(self):
+        # Forget the oldest finished jobs once we hold more than `keep`
+        if len(self._jobs) <= self.keep:
+            return
+        for job_id in [j.id for j in self._jobs.values() if j.finished][:len(self._jobs) - self.keep]:
+            del self._jobs[job_id]
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            job.run()
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {
+                'workers': self.workers,
+                'pending': self._queue.qsize(),
+                'max_pending': self._queue.maxsize,
+                'rejected': self.rejected,
+                'jobs': counts,
+            }
@@ -0,0 +1,161 @@
+"""In-process metrics rendered in the Prometheus text exposition format (served on /metrics)."""
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Seconds; covers a cache hit (~1 ms) up to a cold model load
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join('{}="{}"'.format(n, str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+                     for n, v in zip(names, values))
+    return '{' + pairs + '}'
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, '') for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, self.labelnames, key, value) for key, value in self._values.items()]
+
+
+class Gauge:
+    """A value read from `fn` at scrape time; `fn` returns a number or {label tuple: number}."""
+    kind = 'gauge'
+
+    def __init__(self, name, help, fn, labelnames=()):
+        self.name, self.help, self.fn, self.labelnames = name, help, fn, tuple(labelnames)
+
+    def samples(self):
+        value = self.fn()
+        if value is None:
+            return []
+        if isinstance(value, dict):
+            return [(self.name, self.labelnames, key, v) for key, v in value.items()]
+        return [(self.name, (), (), value)]
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._series = {}  # label tuple -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, '') for n in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        out = []
+        bucket_labels = self.labelnames + ('le',)
+        for key, series in snapshot.items():
+            for bound, count in zip(self.buckets, series):
+                out.append((self.name + '_bucket', bucket_labels, key + (_number(bound),), count))
+            out.append((self.name + '_sum', self.labelnames, key, round(series[-2], 6)))
+            out.append((self.name + '_count', self.labelnames, key, series[-1]))
+        return out
+
+
+REGISTRY = []
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, names, key, value in metric.samples():
+            lines.append(f"{name}{_labels(names, key)} {_number(value)}")
+    return '\n'.join(lines) + '\n'
+
+
+# === Process ===
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+_started = time.time()
+
+def peak_resident_memory_bytes():
+    """Peak RSS of this process, or None where the resource module is missing (Windows)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KiB on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def resident_memory_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        # Peak rather than current RSS where /proc is unavailable; None (gauge skipped) on Windows
+        return peak_resident_memory_bytes()
+
+def cpu_seconds():
+    # User + system time of this process on every platform
+    return round(time.process_time(), 3)
+
+
+# === Application metrics ===
+REQUEST_SECONDS = register(Histogram(
+    'http_request_duration_seconds', "Time to produce a response (first byte for streamed ones)",
+    labelnames=('route', 'method', 'status')))
+STAGE_SECONDS = register(Histogram(
+    'stage_duration_seconds', "Wall time of request/job stages (save, decode, inference, remedy, render...)",
+    labelnames=('stage',)))
+INFERENCE_BATCH_SIZE = register(Histogram(
+    'inference_batch_size', "Images per model forward pass", buckets=BATCH_SIZE_BUCKETS))
+INFERENCE_SECONDS = register(Histogram(
+    'inference_batch_duration_seconds', "Wall time of one model forward pass"))
+SLOW_REQUEST_PROFILES = register(Counter(
+    'slow_request_profiles_total', "Slow requests whose sampled stacks were written to disk", ('route',)))
+register(Gauge('process_resident_memory_bytes', "Resident set size", resident_memory_bytes))
+register(Gauge('process_cpu_seconds_total', "User + system CPU time", cpu_seconds))
+register(Gauge('process_start_time_seconds', "Unix time the process started", lambda: round(_started, 3)))
+
+def observe_stage(name, seconds):
+    STAGE_SECONDS.observe(seconds, stage=name)
+
+def observe_batch(size, seconds):
+    INFERENCE_BATCH_SIZE.observe(size)
+    INFERENCE_SECONDS.observe(seconds)
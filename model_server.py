@@ -0,0 +1,219 @@
+import argparse
+import atexit
+import json
+import os
+import socket
+import socketserver
+import threading
+from contextlib import contextmanager
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+
+SOCKET_PATH = os.environ.get('MODEL_SERVER_SOCKET', '/tmp/rice_model_server.sock')
+CONNECT_TIMEOUT = float(os.environ.get('MODEL_SERVER_TIMEOUT', 30))
+# Idle socket + shared-memory pairs each web worker keeps open to the server
+POOL_SIZE = int(os.environ.get('MODEL_SERVER_POOL_SIZE', 4))
+
+
+def _attach(name):
+    # Attach without letting this process' resource tracker unlink the owner's segment on exit
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+# === Server (owns the only copy of the model) ===
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        attached = {}
+        try:
+            for line in self.rfile:
+                msg = json.loads(line)
+                try:
+                    reply = self.server.dispatch(msg, attached)
+                except Exception as e:
+                    reply = {'error': f"{type(e).__name__}: {e}"}
+                self.wfile.write(json.dumps(reply).encode() + b'\n')
+                self.wfile.flush()
+        finally:
+            for shm in attached.values():
+                shm.close()
+
+
+class ModelServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, socket_path, backend, model_path, batching=True):
+        from inference_backends import load_backend
+        from batching import MicroBatcher
+        self.model = load_backend(backend, model_path)
+        self.model_path = model_path
+        self.batcher = MicroBatcher(self.model.predict) if batching else None
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        super().__init__(socket_path, _Handler)
+
+    def dispatch(self, msg, attached):
+        op = msg.get('op')
+        if op == 'ping':
+            return {'ok': True, 'model_path': self.model_path}
+        if op == 'stats':
+            return self.batcher.stats() if self.batcher else {}
+        if op != 'predict':
+            raise ValueError(f"Unknown op: {op}")
+
+        name = msg['shm']
+        if name not in attached:
+            # The client replaced (and unlinked) its segment; let go of the old mapping
+            for old in attached.values():
+                old.close()
+            attached.clear()
+            attached[name] = _attach(name)
+        shape = tuple(msg['shape'])
+        # Zero-copy view onto the client's buffer
+        batch = np.ndarray(shape, dtype=msg['dtype'], buffer=attached[name].buf)
+        # Single images from concurrent workers are coalesced; whole batches go straight through
+        if self.batcher is not None and shape[0] == 1:
+            probs = [self.batcher.submit(batch[0])]
+        else:
+            probs = self.model.predict(batch)
+        return {'probs': np.asarray(probs, dtype=np.float32).tolist()}
+
+
+# === Client (used by web workers as the 'remote' inference backend) ===
+class _Channel:
+    """One socket to the server plus the shared-memory segment its batches travel in."""
+
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        self.shm = None
+        self._connect()
+
+    def _connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(CONNECT_TIMEOUT)
+        self.sock.connect(self.socket_path)
+        self.reader = self.sock.makefile('rb')
+
+    def buffer(self, nbytes):
+        if self.shm is None or self.shm.size < nbytes:
+            old = self.shm
+            self.shm = shared_memory.SharedMemory(create=True, size=nbytes)
+            if old is not None:
+                old.close()
+                old.unlink()
+        return self.shm
+
+    def call(self, msg):
+        for attempt in (0, 1):
+            try:
+                self.sock.sendall(json.dumps(msg).encode() + b'\n')
+                line = self.reader.readline()
+                if not line:
+                    raise ConnectionError("Model server closed the connection")
+                break
+            except OSError:
+                self.reader.close()
+                self.sock.close()
+                if attempt:
+                    raise
+                self._connect()
+        reply = json.loads(line)
+        if 'error' in reply:
+            raise RuntimeError(f"Model server error: {reply['error']}")
+        return reply
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
+class RemoteBackend:
+    name = 'remote'
+
+    def __init__(self, socket_path=None, pool_size=POOL_SIZE):
+        self.socket_path = socket_path or SOCKET_PATH
+        self.pool_size = pool_size
+        self._idle = []
+        self._open = set()
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    @contextmanager
+    def _channel(self):
+        # Checked out per call, so request threads share a few sockets and segments
+        with self._lock:
+            channel = self._idle.pop() if self._idle else None
+        if channel is None:
+            channel = _Channel(self.socket_path)
+            with self._lock:
+                self._open.add(channel)
+        try:
+            yield channel
+        except BaseException:
+            self._discard(channel)
+            raise
+        with self._lock:
+            keep = channel in self._open and len(self._idle) < self.pool_size
+            if keep:
+                self._idle.append(channel)
+        if not keep:
+            self._discard(channel)
+
+    def _discard(self, channel):
+        with self._lock:
+            self._open.discard(channel)
+        channel.close()
+
+    def predict(self, batch):
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        with self._channel() as channel:
+            shm = channel.buffer(batch.nbytes)
+            np.ndarray(batch.shape, dtype=batch.dtype, buffer=shm.buf)[...] = batch
+            reply = channel.call({'op': 'predict', 'shm': shm.name,
+                                  'shape': list(batch.shape), 'dtype': batch.dtype.str})
+        return np.asarray(reply['probs'], dtype=np.float32)
+
+    def stats(self):
+        with self._channel() as channel:
+            return channel.call({'op': 'stats'})
+
+    def close(self):
+        with self._lock:
+            channels = list(self._open)
+            self._open.clear()
+            self._idle = []
+        for channel in channels:
+            channel.close()
+
+
+def main(argv=None):
+    from inference_backends import DEFAULT_ARTIFACTS
+    parser = argparse.ArgumentParser(description="Serve the rice disease model to local web workers over a Unix socket")
+    parser.add_argument('--socket', default=SOCKET_PATH)
+    parser.add_argument('--backend', default=os.environ.get('MODEL_SERVER_BACKEND', 'keras'))
+    parser.add_argument('--model', help="Model artifact (default depends on backend)")
+    parser.add_argument('--no-batching', action='store_true')
+    args = parser.parse_args(argv)
+
+    model_path = args.model or DEFAULT_ARTIFACTS[args.backend]
+    server = ModelServer(args.socket, args.backend, model_path, batching=not args.no_batching)
+    print(f"Serving {model_path} ({args.backend}) on {args.socket}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.remove(args.socket)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Rendered /result and /confidence-chart pages, cached per (route, prediction id, language).
+
+A prediction never changes once it is in the history table, so its rendered
+page only goes stale when the template or the remedy catalog does; both are
+part of the ETag (see etag_for) and the cache is keyed by that tag.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+MAX_ENTRIES = int(os.environ.get('PAGE_CACHE_SIZE', 1024))
+
+
+def etag_for(*parts):
+    return hashlib.sha1('\x1f'.join(str(p) for p in parts).encode('utf-8')).hexdigest()
+
+
+class PageCache:
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._pages = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, etag):
+        with self._lock:
+            html = self._pages.get(etag)
+            if html is None:
+                self.misses += 1
+                return None
+            self._pages.move_to_end(etag)
+            self.hits += 1
+            return html
+
+    def put(self, etag, html):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._pages[etag] = html
+            self._pages.move_to_end(etag)
+            while len(self._pages) > self.max_entries:
+                self._pages.popitem(last=False)
+
+    def record_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._pages), 'max_entries': self.max_entries,
+                    'hits': self.hits, 'misses': self.misses, 'not_modified': self.not_modified,
+                    'bytes': sum(len(p) for p in self._pages.values())}
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+MODEL_PATH = 'rice_disease_model.h5'
+MEMORY_ENTRIES = int(os.environ.get('PREDICTION_CACHE_SIZE', 2048))
+DB_PATH = os.environ.get('PREDICTION_CACHE_DB', 'prediction_cache.db')  # empty string disables the disk tier
+DB_MAX_BYTES = int(float(os.environ.get('PREDICTION_CACHE_DB_MAX_MB', 64)) * 1024 * 1024)
+
+
+def file_fingerprint(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()[:16]
+
+
+class PredictionCache:
+    """Maps sha256(upload bytes) + model version to (disease, confidence, probs).
+
+    Two tiers: an in-process LRU and an optional SQLite file shared by workers.
+    The version covers the model file, any ensemble model files and `config`
+    (settings such as TTA that change the result for the same bytes); entries
+    for an older version are dropped as soon as any of them changes.
+    """
+
+    def __init__(self, model_path=MODEL_PATH, max_entries=MEMORY_ENTRIES,
+                 db_path=DB_PATH, max_db_bytes=DB_MAX_BYTES, ensemble_paths=(), config=None):
+        self.model_path = model_path
+        self.paths = [model_path] + list(ensemble_paths)
+        self.config = json.dumps(config or {}, sort_keys=True)
+        self.max_entries = max_entries
+        self.max_db_bytes = max_db_bytes
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._model_stat = None
+        self._model_version = None
+        self.hits = {'memory': 0, 'disk': 0}
+        self.misses = 0
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""CREATE TABLE IF NOT EXISTS prediction_cache (
+                                    key TEXT PRIMARY KEY,
+                                    model TEXT,
+                                    value TEXT,
+                                    size INTEGER,
+                                    last_used REAL)""")
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_prediction_cache_last_used ON prediction_cache(last_used)")
+            self._db.commit()
+
+    # === Model version ===
+    @staticmethod
+    def _stat(path):
+        try:
+            st = os.stat(path)
+            return st.st_size, st.st_mtime_ns
+        except OSError:
+            return None
+
+    def model_version(self):
+        stat = tuple(self._stat(p) for p in self.paths)
+        if stat != self._model_stat:
+            with self._lock:
+                if stat != self._model_stat:
+                    parts = [file_fingerprint(p) if st else 'missing' for p, st in zip(self.paths, stat)]
+                    parts.append(self.config)
+                    self._model_version = hashlib.sha256('|'.join(parts).encode()).hexdigest()[:16]
+                    self._model_stat = stat
+                    self._invalidate()
+        return self._model_version
+
+    def _invalidate(self):
+        self._memory.clear()
+        if self._db is not None:
+            self._db.execute("DELETE FROM prediction_cache WHERE model != ?", (self._model_version,))
+            self._db.commit()
+
+    # === Lookup ===
+    def key(self, data):
+        return self.key_for_digest(hashlib.sha256(data).hexdigest())
+
+    def key_for_digest(self, digest):
+        """Key from an upload's sha256 hex digest computed elsewhere (e.g. while streaming it to disk)."""
+        return f"{self.model_version()}:{digest}"
+
+    def get(self, key):
+        self.model_version()
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits['memory'] += 1
+                return self._memory[key]
+            if self._db is not None:
+                row = self._db.execute("SELECT value FROM prediction_cache WHERE key=?", (key,)).fetchone()
+                if row:
+                    self._db.execute("UPDATE prediction_cache SET last_used=? WHERE key=?", (time.time(), key))
+                    self._db.commit()
+                    value = tuple(json.loads(row[0]))
+                    self._remember(key, value)
+                    self.hits['disk'] += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._remember(key, tuple(value))
+            if self._db is not None:
+                payload = json.dumps(list(value))
+                self._db.execute("INSERT OR REPLACE INTO prediction_cache VALUES (?, ?, ?, ?, ?)",
+                                 (key, key.split(':', 1)[0], payload, len(payload), time.time()))
+                self._evict_disk()
+                self._db.commit()
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM prediction_cache").fetchone()[0]
+        if total <= self.max_db_bytes:
+            return
+        # Drop least recently used rows until we are back under 90% of the budget
+        excess = total - int(self.max_db_bytes * 0.9)
+        freed = 0
+        stale = []
+        for key, size in self._db.execute("SELECT key, size FROM prediction_cache ORDER BY last_used"):
+            stale.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._db.executemany("DELETE FROM prediction_cache WHERE key=?", stale)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits['memory'] + self.hits['disk'] + self.misses
+            stats = {
+                'model_version': self._model_version,
+                'memory_entries': len(self._memory),
+                'memory_hits': self.hits['memory'],
+                'disk_hits': self.hits['disk'],
+                'misses': self.misses,
+                'hit_rate': round((lookups - self.misses) / lookups, 4) if lookups else 0.0,
+            }
+            if self._db is not None:
+                count, size = self._db.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM prediction_cache").fetchone()
+                stats.update(disk_entries=count, disk_bytes=size)
+            return stats
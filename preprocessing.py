@@ -0,0 +1,66 @@
+import os
+import threading
+
+import numpy as np
+from PIL import Image
+
+IMG_SIZE = (224, 224)
+# Let libjpeg decode at 1/2, 1/4 or 1/8 scale when the photo is much larger than IMG_SIZE.
+# Faster, but the pixels differ from the full decode + resize the model was trained on, so it
+# is opt-in; check accuracy first with `DRAFT_DECODE=1 python evaluate.py ...`.
+DRAFT_DECODE = os.environ.get('DRAFT_DECODE', '0') == '1'
+_SCALE = np.float32(1.0 / 255.0)
+
+
+def decode(source, size=IMG_SIZE, draft=DRAFT_DECODE):
+    """Decode a path or file object into an RGB PIL image of `size`."""
+    with Image.open(source) as img:
+        if draft and img.format == 'JPEG':
+            img.draft('RGB', size)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        if img.size != size:
+            img = img.resize(size, Image.NEAREST)
+        else:
+            img.load()
+        return img
+
+
+class BatchBuffer:
+    """Preallocated uint8 + float32 batch that images are decoded straight into."""
+
+    def __init__(self, capacity, size=IMG_SIZE):
+        w, h = size
+        self.size = size
+        self.uint8 = np.empty((capacity, h, w, 3), dtype=np.uint8)
+        self.float32 = np.empty((capacity, h, w, 3), dtype=np.float32)
+
+    @property
+    def capacity(self):
+        return self.uint8.shape[0]
+
+    def load(self, index, source, draft=DRAFT_DECODE):
+        img = decode(source, self.size, draft)
+        self.uint8[index] = np.asarray(img)
+
+    def normalized(self, count=None):
+        """Scale the first `count` images to [0, 1] with a single in-place multiply."""
+        count = self.capacity if count is None else count
+        out = self.float32[:count]
+        np.multiply(self.uint8[:count], _SCALE, out=out, casting='unsafe')
+        return out
+
+
+_local = threading.local()
+
+def thread_buffer():
+    """A one-image BatchBuffer reused by every request handled on this thread."""
+    buf = getattr(_local, 'buffer', None)
+    if buf is None:
+        buf = _local.buffer = BatchBuffer(1)
+    return buf
+
+def preprocess(source, draft=DRAFT_DECODE):
+    """Return a fresh (H, W, 3) float32 array in [0, 1]; callers may keep it."""
+    img = np.asarray(decode(source, draft=draft))
+    return np.multiply(img, _SCALE, dtype=np.float32)
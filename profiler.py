@@ -0,0 +1,79 @@
+"""Opt-in sampling profiler for slow requests.
+
+With PROFILE_SLOW_MS set, a background thread samples the stack of every thread
+that is handling a request every PROFILE_INTERVAL_MS. When a request takes at
+least PROFILE_SLOW_MS its samples are written to PROFILE_DIR in the collapsed
+format ("frame;frame;frame count") read by flamegraph.pl and speedscope.
+"""
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', 0))  # 0 disables
+INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+MAX_DEPTH = 128
+
+
+def _collapse(frame):
+    names = []
+    while frame is not None and len(names) < MAX_DEPTH:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class SamplingProfiler:
+    def __init__(self, slow_ms=SLOW_MS, interval_ms=INTERVAL_MS, out_dir=PROFILE_DIR):
+        self.slow_s = slow_ms / 1000.0
+        self.interval = interval_ms / 1000.0
+        self.out_dir = out_dir
+        self._active = {}  # thread id -> Counter of collapsed stacks
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return self.slow_s > 0
+
+    def begin(self):
+        if not self.enabled:
+            return
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._sample, name='sampling-profiler', daemon=True)
+                    self._thread.start()
+        with self._lock:
+            self._active[threading.get_ident()] = Counter()
+
+    def end(self, label, seconds):
+        """Stop sampling this thread; returns the written file when the request was slow."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            samples = self._active.pop(threading.get_ident(), None)
+        if not samples or seconds < self.slow_s:
+            return None
+        os.makedirs(self.out_dir, exist_ok=True)
+        safe = re.sub(r'[^A-Za-z0-9_.-]+', '_', label).strip('_') or 'root'
+        path = os.path.join(self.out_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{int(seconds * 1000)}ms-{safe}.folded")
+        with open(path, 'w') as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+    def _sample(self):
+        me = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, samples in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None and ident != me:
+                        samples[_collapse(frame)] += 1
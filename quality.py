@@ -0,0 +1,135 @@
+"""NumPy-only image quality gate run before the CNN.
+
+Checks the decoded IMG_SIZE image (and the original's pixel size) for blur
+(variance of the Laplacian), over/under-exposure (luminance histogram tails),
+too small a photo and too little leaf-coloured area (excess-green index).
+QUALITY_GATE=reject skips inference for failing images, 'flag' only reports
+the reasons alongside the prediction, 'off' disables the gate.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+import metrics
+
+# 'flag' until the thresholds below have a measured false-reject rate on the disease classes
+MODE = os.environ.get('QUALITY_GATE', 'flag')
+MIN_SHARPNESS = float(os.environ.get('QUALITY_MIN_SHARPNESS', 20))  # Laplacian variance on the 112 px image
+MAX_CLIPPED = float(os.environ.get('QUALITY_MAX_CLIPPED', 0.5))  # fraction of pixels at either end
+MIN_BRIGHTNESS = float(os.environ.get('QUALITY_MIN_BRIGHTNESS', 25))
+MAX_BRIGHTNESS = float(os.environ.get('QUALITY_MAX_BRIGHTNESS', 235))
+MIN_SIDE = int(os.environ.get('QUALITY_MIN_SIDE', 128))  # original pixels
+MIN_LEAF_FRACTION = float(os.environ.get('QUALITY_MIN_LEAF_FRACTION', 0.08))
+
+REASONS = {
+    'blurry': "The photo is too blurry; hold the camera steady and focus on the leaf.",
+    'overexposed': "The photo is overexposed; avoid direct sunlight or flash on the leaf.",
+    'underexposed': "The photo is too dark; take it in better light.",
+    'too_small': "The photo resolution is too low; move closer or use a higher resolution.",
+    'no_leaf': "No rice leaf detected; fill the frame with a single leaf.",
+}
+
+_REJECTIONS = metrics.register(metrics.Counter(
+    'quality_gate_failures_total', "Images failing a quality check", ('reason', 'action')))
+
+
+def measure(image):
+    """Quality figures for one (H, W, 3) uint8 image, computed at half resolution."""
+    small = image[::2, ::2].astype(np.float32)
+    r, g, b = small[..., 0], small[..., 1], small[..., 2]
+    luma = 0.299 * r + 0.587 * g + 0.114 * b
+    lap = 4 * luma[1:-1, 1:-1] - luma[:-2, 1:-1] - luma[2:, 1:-1] - luma[1:-1, :-2] - luma[1:-1, 2:]
+    total = r + g + b + 1e-6
+    # Excess green on chromaticity: high for leaf tissue, ~0 for soil, sky, paper and grey scenes
+    exg = (2 * g - r - b) / total
+    return {
+        'sharpness': float(lap.var()),
+        'brightness': float(luma.mean()),
+        'clipped_high': float((luma >= 250).mean()),
+        'clipped_low': float((luma <= 5).mean()),
+        'leaf_fraction': float((exg > 0.05).mean()),
+    }
+
+def failures(figures, original_size=None):
+    found = []
+    if figures['sharpness'] < MIN_SHARPNESS:
+        found.append('blurry')
+    if figures['clipped_high'] > MAX_CLIPPED or figures['brightness'] > MAX_BRIGHTNESS:
+        found.append('overexposed')
+    if figures['clipped_low'] > MAX_CLIPPED or figures['brightness'] < MIN_BRIGHTNESS:
+        found.append('underexposed')
+    if original_size and min(original_size) < MIN_SIDE:
+        found.append('too_small')
+    if figures['leaf_fraction'] < MIN_LEAF_FRACTION:
+        found.append('no_leaf')
+    return found
+
+
+class QualityGate:
+    """Runs the checks and keeps the numbers behind /quality-stats."""
+
+    def __init__(self, mode=MODE):
+        self.mode = mode
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.rejected = 0
+        self.flagged = 0
+        self.reasons = {}
+        self.gate_s = 0.0
+        self.inferences = 0
+        self.inference_s = 0.0
+
+    @property
+    def enabled(self):
+        return self.mode in ('reject', 'flag')
+
+    def check(self, image, original_size=None):
+        """{'ok', 'action', 'reasons', 'messages', 'figures', 'ms'}; 'ok' is False only when rejecting."""
+        started = time.perf_counter()
+        figures = measure(image)
+        found = failures(figures, original_size)
+        seconds = time.perf_counter() - started
+        action = (self.mode if found else 'pass')
+        with self._lock:
+            self.checked += 1
+            self.gate_s += seconds
+            if action == 'reject':
+                self.rejected += 1
+            elif action == 'flag':
+                self.flagged += 1
+            for reason in found:
+                self.reasons[reason] = self.reasons.get(reason, 0) + 1
+        for reason in found:
+            _REJECTIONS.inc(reason=reason, action=action)
+        return {
+            'ok': action != 'reject',
+            'action': action,
+            'reasons': found,
+            'messages': [REASONS[r] for r in found],
+            'figures': {k: round(v, 4) for k, v in figures.items()},
+            'ms': round(seconds * 1000, 3),
+        }
+
+    def record_inference(self, seconds):
+        with self._lock:
+            self.inferences += 1
+            self.inference_s += seconds
+
+    def stats(self):
+        with self._lock:
+            mean_inference = self.inference_s / self.inferences if self.inferences else None
+            saved = self.rejected * mean_inference if mean_inference is not None else None
+            return {
+                'mode': self.mode,
+                'checked': self.checked,
+                'rejected': self.rejected,
+                'flagged': self.flagged,
+                'reasons': dict(self.reasons),
+                'mean_gate_ms': round(self.gate_s / self.checked * 1000, 3) if self.checked else None,
+                'mean_inference_ms': round(mean_inference * 1000, 3) if mean_inference is not None else None,
+                'gate_cost_s': round(self.gate_s, 3),
+                'inference_saved_s': round(saved, 3) if saved is not None else None,
+                'net_saved_s': round(saved - self.gate_s, 3) if saved is not None else None,
+            }
@@ -0,0 +1,179 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from fpdf import FPDF
+from PIL import Image
+
+UPLOAD_FOLDER = 'static/uploaded'
+THUMBNAIL_DIR = 'static/report_images'
+THUMBNAIL_SIZE = (800, 800)
+CACHE_BYTES = int(float(os.environ.get('REPORT_CACHE_MB', 64)) * 1024 * 1024)
+
+
+# === Thumbnails ===
+_thumbnails = {}
+_thumbnail_lock = threading.Lock()
+
+def write_thumbnail(image_path, path):
+    with Image.open(image_path) as img:
+        img.draft('RGB', THUMBNAIL_SIZE)
+        img = img.convert('RGB')
+        img.thumbnail(THUMBNAIL_SIZE)
+        tmp = path + f'.{threading.get_ident()}.tmp'
+        img.save(tmp, 'JPEG', quality=85)
+        os.replace(tmp, path)
+    return path
+
+def report_thumbnail(image_path):
+    """JPEG thumbnail of an upload for embedding, built once per (path, mtime, size)."""
+    # The upload store already wrote one at ingest
+    stored = os.path.splitext(image_path)[0] + '.thumb.jpg'
+    if os.path.exists(stored):
+        return stored
+    try:
+        st = os.stat(image_path)
+    except OSError:
+        return None
+    key = (image_path, st.st_mtime_ns, st.st_size)
+    path = _thumbnails.get(key)
+    if path and os.path.exists(path):
+        return path
+
+    os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+    path = os.path.join(THUMBNAIL_DIR, hashlib.sha1(repr(key).encode()).hexdigest() + '.jpg')
+    if not os.path.exists(path):
+        write_thumbnail(image_path, path)
+    with _thumbnail_lock:
+        _thumbnails[key] = path
+    return path
+
+
+# === Rendering ===
+def _image_path(data):
+    if 'image_path' in data:
+        return data['image_path']
+    return os.path.join(UPLOAD_FOLDER, data.get('image') or data['filename'])
+
+def _add_prediction_page(pdf, data):
+    remedy = data['remedy']
+    pdf.add_page()
+    pdf.set_font("Arial", 'B', 16)
+    pdf.cell(0, 10, "Rice Disease Detection Report", ln=True, align='C')
+
+    pdf.set_font("Arial", size=12)
+    pdf.cell(0, 10, f"User: {data['username']}", ln=True)
+    pdf.cell(0, 10, f"Date: {data.get('created') or datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", ln=True)
+    pdf.cell(0, 10, f"Disease: {data['disease']}", ln=True)
+    pdf.cell(0, 10, f"Confidence: {data['confidence']}%", ln=True)
+    pdf.ln(5)
+
+    # Description
+    pdf.set_font("Arial", 'B', 14)
+    pdf.cell(0, 10, "Description:", ln=True)
+    pdf.set_font("Arial", size=12)
+    pdf.multi_cell(0, 8, remedy.get('description', ''))
+
+    # Management
+    if remedy.get('management'):
+        pdf.set_font("Arial", 'B', 14)
+        pdf.cell(0, 10, "Recommended Management Practices:", ln=True)
+        pdf.set_font("Arial", size=12)
+        for point in remedy['management']:
+            pdf.multi_cell(0, 8, f"- {point}")
+
+    # Solutions
+    if remedy.get('solutions'):
+        pdf.set_font("Arial", 'B', 14)
+        pdf.cell(0, 10, "Solutions:", ln=True)
+        pdf.set_font("Arial", size=12)
+        for sol in remedy['solutions']:
+            pdf.multi_cell(0, 8, f"- {sol}")
+
+    # Add image
+    try:
+        image_path = _image_path(data)
+        thumbnail = report_thumbnail(image_path) if image_path else None
+        if thumbnail:
+            pdf.image(thumbnail, x=60, y=pdf.get_y() + 10, w=90)
+    except Exception as e:
+        print(f"[Warning] Could not add image: {e}")
+
+def _pdf_bytes(pdf):
+    # fpdf 1.x returns a latin-1 str, fpdf2 a bytearray
+    out = pdf.output(dest='S')
+    return out.encode('latin-1') if isinstance(out, str) else bytes(out)
+
+def render_report(data):
+    pdf = FPDF()
+    _add_prediction_page(pdf, data)
+    return _pdf_bytes(pdf)
+
+def render_batch_report(predictions, username=None):
+    """One document for many predictions: a summary table followed by a page per image."""
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", 'B', 16)
+    pdf.cell(0, 10, "Rice Disease Detection - Batch Report", ln=True, align='C')
+    pdf.set_font("Arial", size=12)
+    if username:
+        pdf.cell(0, 10, f"User: {username}", ln=True)
+    pdf.cell(0, 10, f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", ln=True)
+    pdf.cell(0, 10, f"Images: {len(predictions)}", ln=True)
+    pdf.ln(5)
+
+    pdf.set_font("Arial", 'B', 11)
+    pdf.cell(100, 8, "Image", border=1)
+    pdf.cell(60, 8, "Disease", border=1)
+    pdf.cell(30, 8, "Confidence", border=1, ln=True)
+    pdf.set_font("Arial", size=10)
+    for data in predictions:
+        pdf.cell(100, 7, str(data.get('filename', ''))[:55], border=1)
+        pdf.cell(60, 7, str(data['disease']), border=1)
+        pdf.cell(30, 7, f"{data['confidence']}%", border=1, ln=True)
+
+    for data in predictions:
+        _add_prediction_page(pdf, data)
+    return _pdf_bytes(pdf)
+
+
+# === Cache ===
+_cache = OrderedDict()
+_cache_size = 0
+_cache_lock = threading.Lock()
+_hits = 0
+_misses = 0
+
+def report_key(data):
+    if data.get('id') is not None:
+        return str(data['id'])
+    fields = (data['username'], data['filename'], data['disease'], data['confidence'])
+    return hashlib.sha1(repr(fields).encode()).hexdigest()
+
+def get_report(data):
+    """Rendered PDF bytes for one prediction, cached by prediction id."""
+    global _cache_size, _hits, _misses
+    key = report_key(data)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            _hits += 1
+            return _cache[key]
+        _misses += 1
+
+    pdf = render_report(data)
+    with _cache_lock:
+        if key not in _cache:
+            _cache[key] = pdf
+            _cache_size += len(pdf)
+        while _cache_size > CACHE_BYTES and len(_cache) > 1:
+            _, old = _cache.popitem(last=False)
+            _cache_size -= len(old)
+    return pdf
+
+def stats():
+    with _cache_lock:
+        return {'entries': len(_cache), 'bytes': _cache_size, 'hits': _hits,
+                'misses': _misses, 'thumbnails': len(_thumbnails)}
@@ -0,0 +1,74 @@
+import hashlib
+import threading
+
+import pytest
+
+import auth_utils
+import credentials
+import db
+
+
+@pytest.fixture(autouse=True)
+def users_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DB_PATH', str(tmp_path / 'users.db'))
+    # Cheap scrypt cost and no verify cache so every login really runs the KDF
+    monkeypatch.setattr(credentials, 'SCRYPT_N', 2 ** 10)
+    monkeypatch.setattr(credentials, 'VERIFY_CACHE_TTL', 0)
+    auth_utils.create_users_table()
+    yield
+    db.close_all()
+
+
+def add_row(username, stored):
+    with db.transaction() as conn:
+        conn.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, stored))
+
+def stored(username):
+    return db.query_one("SELECT password FROM users WHERE username = ?", (username,))['password']
+
+
+def test_legacy_sha256_row_is_rehashed_on_login():
+    add_row('alice', hashlib.sha256(b'secret').hexdigest())
+    assert auth_utils.login_user('alice', 'secret')
+    new = stored('alice')
+    assert new.startswith(f"scrypt${credentials.SCRYPT_N}$")
+    assert not credentials.needs_rehash(new)
+    assert auth_utils.login_user('alice', 'secret')
+    assert stored('alice') == new
+
+def test_outdated_scrypt_cost_is_rehashed_on_login():
+    add_row('bob', credentials._hash('secret', n=2 ** 8))
+    assert auth_utils.login_user('bob', 'secret')
+    assert stored('bob').startswith(f"scrypt${credentials.SCRYPT_N}${credentials.SCRYPT_R}${credentials.SCRYPT_P}$")
+
+def test_wrong_password_leaves_row_unchanged():
+    legacy = hashlib.sha256(b'secret').hexdigest()
+    add_row('carol', legacy)
+    assert not auth_utils.login_user('carol', 'wrong')
+    assert stored('carol') == legacy
+
+def test_unknown_user():
+    assert not auth_utils.login_user('nobody', 'secret')
+
+@pytest.mark.parametrize('bad', ['scrypt$x$8$1$AAAA$AAAA', 'scrypt$1024$8$1$!!!$AAAA', 'scrypt$3$8$1$AAAA$AAAA',
+                                 'md5$abc', ''])
+def test_malformed_hash_fails_login(bad):
+    add_row('dave', bad)
+    assert not auth_utils.login_user('dave', 'secret')
+
+def test_signup_then_login():
+    assert auth_utils.signup_user('erin', 'secret')
+    assert not auth_utils.signup_user('erin', 'other')
+    assert auth_utils.login_user('erin', 'secret')
+    assert not auth_utils.login_user('erin', 'other')
+
+def test_kdf_busy_when_no_slot_frees_up(monkeypatch):
+    add_row('frank', credentials._hash('secret'))
+    monkeypatch.setattr(credentials, '_slots', threading.BoundedSemaphore(1))
+    monkeypatch.setattr(credentials, 'KDF_WAIT_S', 0.01)
+    credentials._slots.acquire()
+    try:
+        with pytest.raises(credentials.KDFBusy):
+            auth_utils.login_user('frank', 'secret')
+    finally:
+        credentials._slots.release()
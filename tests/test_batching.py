@@ -0,0 +1,105 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from batching import MicroBatcher
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+def run_concurrently(batcher, values):
+    results, errors = {}, {}
+
+    def call(v):
+        try:
+            results[v] = batcher.submit(np.full((2, 2, 1), v, dtype=np.float32), timeout=5)
+        except Exception as e:
+            errors[v] = e
+
+    threads = [threading.Thread(target=call, args=(v,)) for v in values]
+    for t in threads:
+        t.start()
+    return threads, results, errors
+
+
+def test_concurrent_requests_share_a_forward_pass():
+    started, release = threading.Event(), threading.Event()
+    sizes = []
+
+    def predict(batch):
+        sizes.append(len(batch))
+        started.set()
+        release.wait(5)  # hold the first pass so the rest queue up behind it
+        return batch.reshape(len(batch), -1)[:, :1] * 10
+
+    batcher = MicroBatcher(predict, max_batch_size=8, max_wait_ms=50)
+    try:
+        first, results, errors = run_concurrently(batcher, [0])
+        assert started.wait(5)
+        rest, more, more_errors = run_concurrently(batcher, range(1, 6))
+        wait_until(lambda: batcher.stats()['queue_depth'] == 5)
+        release.set()
+        for t in first + rest:
+            t.join()
+        results.update(more)
+        assert not errors and not more_errors
+        # Every caller gets its own row back
+        assert {v: float(r[0]) for v, r in results.items()} == {v: v * 10.0 for v in range(6)}
+        assert sizes == [1, 5]
+        stats = batcher.stats()
+        assert stats['batches'] == 2 and stats['requests'] == 6 and stats['max_batch_size_seen'] == 5
+    finally:
+        release.set()
+        batcher.close()
+
+def test_batch_is_capped_at_max_batch_size():
+    release = threading.Event()
+    sizes = []
+
+    def predict(batch):
+        sizes.append(len(batch))
+        release.wait(5)
+        return np.zeros((len(batch), 3))
+
+    batcher = MicroBatcher(predict, max_batch_size=3, max_wait_ms=50)
+    try:
+        threads, _, errors = run_concurrently(batcher, range(7))
+        wait_until(lambda: sum(sizes) + batcher.stats()['queue_depth'] == 7)
+        release.set()
+        for t in threads:
+            t.join()
+        assert not errors
+        assert sum(sizes) == 7 and max(sizes) <= 3
+    finally:
+        release.set()
+        batcher.close()
+
+def test_errors_reach_every_caller_in_the_batch_and_the_worker_survives():
+    calls = []
+
+    def predict(batch):
+        calls.append(len(batch))
+        if len(calls) == 1:
+            raise ValueError("model exploded")
+        return np.ones((len(batch), 2))
+
+    batcher = MicroBatcher(predict, max_batch_size=4, max_wait_ms=1)
+    try:
+        with pytest.raises(ValueError, match="model exploded"):
+            batcher.submit(np.zeros((2, 2, 1), dtype=np.float32), timeout=5)
+        # The next request is served normally
+        assert batcher.submit(np.zeros((2, 2, 1), dtype=np.float32), timeout=5).tolist() == [1.0, 1.0]
+    finally:
+        batcher.close()
+
+def test_closed_batcher_rejects_work():
+    batcher = MicroBatcher(lambda b: np.zeros((len(b), 1)))
+    batcher.close()
+    with pytest.raises(RuntimeError):
+        batcher.submit(np.zeros((1,), dtype=np.float32))
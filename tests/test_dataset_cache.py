@@ -0,0 +1,94 @@
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import dataset_cache
+from dataset_cache import ShardedDataset
+
+SIZE = (4, 4)
+
+
+def write_image(path, value):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    Image.new('RGB', (8, 8), (value, value, value)).save(path)
+    # Make sure a rewrite is seen as a change even on coarse-mtime filesystems
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+def build(data_dir, cache_dir):
+    return dataset_cache.build(str(data_dir), str(cache_dir), SIZE, shard_size=2, workers=2)
+
+def shard_files(cache_dir):
+    return sorted(f for f in os.listdir(cache_dir) if f.endswith('.npy'))
+
+def pixel_values(data):
+    return [int(img.max()) for img in data.images(np.arange(len(data)))]
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    data_dir, cache_dir = tmp_path / 'data', tmp_path / 'cache'
+    write_image(data_dir / 'blast' / 'a.png', 10)
+    write_image(data_dir / 'blast' / 'b.png', 20)
+    write_image(data_dir / 'healthy' / 'c.png', 30)
+    return data_dir, cache_dir
+
+
+def test_first_build_decodes_everything(dirs):
+    data_dir, cache_dir = dirs
+    assert build(data_dir, cache_dir) == {'images': 3, 'decoded': 3, 'reused': 0, 'replaced': 0,
+                                          'removed': 0, 'shards': 2}
+    data = ShardedDataset(str(cache_dir))
+    assert data.class_names == ['blast', 'healthy']
+    assert data.paths == [os.path.join('blast', 'a.png'), os.path.join('blast', 'b.png'),
+                          os.path.join('healthy', 'c.png')]
+    assert data.labels.tolist() == [0, 0, 1]
+    assert pixel_values(data) == [10, 20, 30]
+    assert data.images([0, 1]).shape == (2, SIZE[1], SIZE[0], 3)
+
+def test_unchanged_and_touched_files_are_reused(dirs):
+    data_dir, cache_dir = dirs
+    build(data_dir, cache_dir)
+    assert build(data_dir, cache_dir)['decoded'] == 0
+    # New mtime, same bytes: the content hash matches, so no decode
+    path = data_dir / 'blast' / 'a.png'
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    stats = build(data_dir, cache_dir)
+    assert stats['decoded'] == 0 and stats['reused'] == 3
+
+def test_incremental_rebuild_with_added_changed_and_deleted_files(dirs):
+    data_dir, cache_dir = dirs
+    build(data_dir, cache_dir)
+    assert shard_files(cache_dir) == ['shard_00000.npy', 'shard_00001.npy']
+
+    write_image(data_dir / 'blast' / 'b.png', 40)     # changed; shard_00000 still holds a.png
+    os.remove(data_dir / 'healthy' / 'c.png')         # deleted; shard_00001 has nothing else
+    write_image(data_dir / 'healthy' / 'd.png', 50)   # added
+
+    assert build(data_dir, cache_dir) == {'images': 3, 'decoded': 2, 'reused': 1, 'replaced': 1,
+                                          'removed': 1, 'shards': 2}
+    assert shard_files(cache_dir) == ['shard_00000.npy', 'shard_00002.npy']
+    assert dataset_cache.load_manifest(str(cache_dir))['shards'] == ['shard_00000.npy', 'shard_00002.npy']
+
+    data = ShardedDataset(str(cache_dir))
+    assert data.paths == [os.path.join('blast', 'a.png'), os.path.join('blast', 'b.png'),
+                          os.path.join('healthy', 'd.png')]
+    assert data.labels.tolist() == [0, 0, 1]
+    assert pixel_values(data) == [10, 40, 50]
+    batches = list(data.iter_batches(np.arange(3), batch_size=2))
+    assert [b[1].tolist() for b in batches] == [[0, 0], [1]]
+
+def test_size_change_starts_over(dirs):
+    data_dir, cache_dir = dirs
+    build(data_dir, cache_dir)
+    stats = dataset_cache.build(str(data_dir), str(cache_dir), (2, 2), shard_size=4, workers=2)
+    assert stats['decoded'] == 3 and stats['reused'] == 0
+    assert shard_files(cache_dir) == ['shard_00000.npy']
+    assert ShardedDataset(str(cache_dir)).images([0]).shape == (1, 2, 2, 3)
+
+def test_reading_without_a_build_fails(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        ShardedDataset(str(tmp_path))
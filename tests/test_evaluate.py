@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+import evaluate
+
+CLASSES = ['blast', 'brown_spot', 'healthy', 'unused']
+LABELS = np.array([0, 0, 1, 1, 2, 2])
+# argmax -> predictions [0, 1, 1, 1, 0, 2]; the last class never occurs nor is predicted
+PROBS = np.array([
+    [0.90, 0.05, 0.05, 0.0],   # right, confidence 0.90
+    [0.30, 0.60, 0.10, 0.0],   # wrong, 0.60
+    [0.20, 0.70, 0.10, 0.0],   # right, 0.70
+    [0.10, 0.80, 0.10, 0.0],   # right, 0.80
+    [0.45, 0.20, 0.35, 0.0],   # wrong, 0.45
+    [0.10, 0.10, 0.80, 0.0],   # right, 0.80
+])
+
+
+def test_confusion_matrix_rows_are_true_classes():
+    cm = evaluate.confusion_matrix(LABELS, PROBS.argmax(axis=1), 4)
+    assert cm.tolist() == [[1, 1, 0, 0],
+                           [0, 2, 0, 0],
+                           [1, 0, 1, 0],
+                           [0, 0, 0, 0]]
+
+def test_per_class_metrics():
+    cm = evaluate.confusion_matrix(LABELS, PROBS.argmax(axis=1), 4)
+    precision, recall, f1, support = evaluate.per_class_metrics(cm)
+    assert precision == pytest.approx([1 / 2, 2 / 3, 1, 0])
+    assert recall == pytest.approx([1 / 2, 1, 1 / 2, 0])
+    assert f1 == pytest.approx([1 / 2, 4 / 5, 2 / 3, 0])
+    assert support.tolist() == [2, 2, 2, 0]
+
+def test_calibration_error_over_equal_width_bins():
+    ece, table = evaluate.calibration(PROBS, LABELS, bins=4)
+    # |accuracy sum - confidence sum| per bin: 0.25-0.50 -> |0 - 0.45|, 0.50-0.75 -> |1 - 1.3|, 0.75-1 -> |3 - 2.5|
+    assert ece == pytest.approx((0.45 + 0.3 + 0.5) / 6)
+    assert table == [
+        {'bin': '0.25-0.50', 'count': 1, 'confidence': 0.45, 'accuracy': 0.0},
+        {'bin': '0.50-0.75', 'count': 2, 'confidence': 0.65, 'accuracy': 0.5},
+        {'bin': '0.75-1.00', 'count': 3, 'confidence': 0.8333, 'accuracy': 1.0},
+    ]
+
+def test_perfectly_calibrated_confident_predictions_have_zero_ece():
+    probs = np.eye(3)
+    assert evaluate.calibration(probs, np.arange(3), bins=10)[0] == 0.0
+
+def test_summary_macro_f1_skips_classes_without_support():
+    report = evaluate.summarize(PROBS, LABELS, CLASSES, bins=4)
+    assert report['images'] == 6
+    assert report['accuracy'] == round(4 / 6, 4)
+    assert report['macro_f1'] == round((1 / 2 + 4 / 5 + 2 / 3) / 3, 4)
+    assert report['ece'] == round(1.25 / 6, 4)
+    assert report['per_class']['brown_spot'] == {'precision': 0.6667, 'recall': 1.0, 'f1': 0.8, 'support': 2}
+    assert report['per_class']['unused']['support'] == 0
+
+def test_compare_counts_disagreements():
+    other = PROBS.copy()
+    other[1] = [0.7, 0.2, 0.1, 0.0]   # now right where the first model was wrong
+    other[0] = [0.1, 0.8, 0.1, 0.0]   # now wrong where the first model was right
+    result = evaluate.compare(PROBS, other, LABELS)
+    assert result['top1_agreement'] == round(4 / 6, 4)
+    assert result['only_a_correct'] == 1 and result['only_b_correct'] == 1
+    assert result['max_abs_prob_diff'] == pytest.approx(0.8)
@@ -0,0 +1,108 @@
+import itertools
+import os
+import types
+
+import pytest
+
+import prediction_cache
+from prediction_cache import PredictionCache
+
+VALUE = ('Blast', 0.9, [0.1, 0.9])
+ROW_BYTES = len('["Blast", 0.9, [0.1, 0.9]]')
+
+
+@pytest.fixture
+def model(tmp_path):
+    path = tmp_path / 'model.h5'
+    path.write_bytes(b'weights-v1')
+    return path
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'cache.db')
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Strictly increasing last_used stamps, so LRU order never ties
+    ticks = itertools.count(1)
+    monkeypatch.setattr(prediction_cache, 'time', types.SimpleNamespace(time=lambda: float(next(ticks))))
+
+
+def test_memory_only_round_trip(model):
+    cache = PredictionCache(str(model), db_path='')
+    key = cache.key(b'image')
+    assert cache.get(key) is None
+    cache.put(key, VALUE)
+    assert cache.get(key) == VALUE
+    stats = cache.stats()
+    assert stats['memory_hits'] == 1 and stats['misses'] == 1 and 'disk_entries' not in stats
+
+def test_disk_tier_is_shared_between_instances(model, db_path):
+    first = PredictionCache(str(model), db_path=db_path)
+    first.put(first.key(b'image'), VALUE)
+    second = PredictionCache(str(model), db_path=db_path)
+    assert second.get(second.key(b'image')) == VALUE
+    assert second.stats()['disk_hits'] == 1
+
+def test_changed_model_file_invalidates_both_tiers(model, db_path):
+    cache = PredictionCache(str(model), db_path=db_path)
+    old_key = cache.key(b'image')
+    cache.put(old_key, VALUE)
+    model.write_bytes(b'weights-v2')
+    new_key = cache.key(b'image')
+    assert new_key != old_key
+    assert cache.get(old_key) is None and cache.get(new_key) is None
+    assert cache.stats()['memory_entries'] == 0 and cache.stats()['disk_entries'] == 0
+
+def test_touched_model_file_with_same_content_keeps_disk_entries(model, db_path):
+    cache = PredictionCache(str(model), db_path=db_path)
+    key = cache.key(b'image')
+    cache.put(key, VALUE)
+    st = os.stat(model)
+    os.utime(model, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert cache.key(b'image') == key
+    assert cache.get(key) == VALUE
+    assert cache.stats()['disk_hits'] == 1
+
+def test_config_change_gives_new_version_and_drops_old_rows(model, db_path):
+    plain = PredictionCache(str(model), db_path=db_path, config={'tta': None})
+    plain.put(plain.key(b'image'), VALUE)
+    with_tta = PredictionCache(str(model), db_path=db_path, config={'tta': {'flips': 2}})
+    assert with_tta.model_version() != plain.model_version()
+    assert with_tta.get(with_tta.key(b'image')) is None
+    assert with_tta.stats()['disk_entries'] == 0
+
+def test_changed_ensemble_file_invalidates(model, tmp_path, db_path):
+    member = tmp_path / 'member.h5'
+    member.write_bytes(b'member-v1')
+    cache = PredictionCache(str(model), db_path=db_path, ensemble_paths=[str(member)])
+    key = cache.key(b'image')
+    cache.put(key, VALUE)
+    member.write_bytes(b'member-v2, longer')
+    assert cache.get(key) is None
+    assert cache.stats()['disk_entries'] == 0
+
+def test_disk_tier_evicts_least_recently_used(model, db_path, clock):
+    cache = PredictionCache(str(model), db_path=db_path, max_db_bytes=4 * ROW_BYTES)
+    keys = [cache.key(bytes([i])) for i in range(5)]
+    for key in keys[:4]:
+        cache.put(key, VALUE)
+    assert cache.stats()['disk_entries'] == 4
+
+    # Reading the oldest row through a fresh instance (empty memory tier) refreshes its last_used
+    reader = PredictionCache(str(model), db_path=db_path, max_db_bytes=4 * ROW_BYTES)
+    assert reader.get(keys[0]) == VALUE
+
+    # One row over budget: LRU rows go until the total is under 90% of it
+    cache.put(keys[4], VALUE)
+    assert cache.stats()['disk_bytes'] <= 0.9 * 4 * ROW_BYTES
+    fresh = PredictionCache(str(model), db_path=db_path, max_db_bytes=4 * ROW_BYTES)
+    assert [fresh.get(k) is not None for k in keys] == [True, False, False, True, True]
+
+def test_memory_tier_is_bounded(model):
+    cache = PredictionCache(str(model), max_entries=2, db_path='')
+    keys = [cache.key(bytes([i])) for i in range(3)]
+    for key in keys:
+        cache.put(key, VALUE)
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[2]) == VALUE
@@ -1,67 +1,260 @@
+import argparse
+import json
 import os
-import tensorflow as tf
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Conv2D, MaxPooling2D, Flatten, Dense, Dropout
-import matplotlib.pyplot as plt
-# Parameters
-IMG_SIZE = (224, 224)
-BATCH_SIZE = 32
-EPOCHS = 10
-DATA_DIR = r'C:\rice_disease_project\rice_disease_dataset'  # Path to your dataset folder
-# Data preprocessing and augmentation
-train_datagen = ImageDataGenerator(
-    rescale=1./255,
-    rotation_range=30,
-    zoom_range=0.2,
-    horizontal_flip=True,
-    validation_split=0.2
-)
-train_data = train_datagen.flow_from_directory(
-    DATA_DIR,
-    target_size=IMG_SIZE,
-    batch_size=BATCH_SIZE,
-    class_mode='categorical',
-    subset='training'
-)
-val_data = train_datagen.flow_from_directory(
-    DATA_DIR,
-    target_size=IMG_SIZE,
-    batch_size=BATCH_SIZE,
-    class_mode='categorical',
-    subset='validation'
-)
-# Build the CNN model
-model = Sequential([
-    Conv2D(32, (3,3), activation='relu', input_shape=(224,224,3)),
-    MaxPooling2D(2,2),
-    Conv2D(64, (3,3), activation='relu'),
-    MaxPooling2D(2,2),
-    Conv2D(128, (3,3), activation='relu'),
-    MaxPooling2D(2,2),
-    Flatten(),
-    Dense(256, activation='relu'),
-    Dropout(0.5),
-    Dense(train_data.num_classes, activation='softmax')
-])
-# Compile the model
-model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
-# Train the model
-history = model.fit(train_data, validation_data=val_data, epochs=EPOCHS)
-# Save the trained model
-model.save('rice_disease_model.h5')
-# Save class labels
-class_indices = train_data.class_indices
-class_labels = {v: k for k, v in class_indices.items()}
-with open('class_labels.txt', 'w') as f:
-    for i in range(len(class_labels)):
-        f.write(class_labels[i] + '\n')
-# Plot and save training accuracy chart
-plt.plot(history.history['accuracy'], label='Train Accuracy')
-plt.plot(history.history['val_accuracy'], label='Validation Accuracy')
-plt.xlabel('Epochs')
-plt.ylabel('Accuracy')
-plt.legend()
-plt.title('Model Accuracy')
-plt.savefig('training_plot.png')
-plt.show()
\ No newline at end of file
+import time
+
+# Parameters (defaults; override with --config FILE and/or command-line flags)
+DEFAULTS = {
+    'data_dir': os.environ.get('RICE_DATA_DIR', 'rice_disease_dataset'),  # Path to your dataset folder
+    'img_size': 224,
+    'batch_size': 32,
+    'epochs': 10,
+    'learning_rate': 0.001,
+    'architecture': 'cnn',  # see ARCHITECTURES; compare trained models with benchmarks/bench_models.py
+    'weights': 'imagenet',  # backbone initialisation for the pretrained architectures ('none' for random)
+    'fine_tune': False,  # also train the backbone instead of only the new classifier head
+    'pipeline': 'tfdata',  # 'tfdata', 'shards' (dataset_cache.py) or 'legacy' (ImageDataGenerator)
+    'cache_dir': None,  # tf.data cache of decoded/resized images shared across epochs and runs
+    'shard_dir': None,  # Memory-mapped dataset shards; rebuilt incrementally from data_dir
+    'model_path': 'rice_disease_model.h5',
+    'checkpoint_dir': 'checkpoints',
+    'checkpoint_every': 1,  # epochs
+    'resume': False,
+    'early_stopping_patience': 0,  # 0 disables
+    'headless': False,  # Save the plot without opening a window
+    'intra_op_threads': 0,  # 0 lets TensorFlow decide
+    'inter_op_threads': 0,
+    'precision': 'float32',  # or 'mixed_bfloat16' on CPUs with native bf16 (AVX512-BF16/AMX)
+    'metrics_log': 'training_log.jsonl',
+    'export_format': 'tflite',  # TensorFlow-free serving artifact: 'tflite', 'onnx' or None
+    'export_quantize': None,  # None, 'float16' or 'int8' (tflite only)
+}
+
+
+def parse_config(argv=None):
+    parser = argparse.ArgumentParser(description="Train the rice disease CNN")
+    parser.add_argument('--config', help="JSON file with any of the options below")
+    for key, default in DEFAULTS.items():
+        flag = '--' + key.replace('_', '-')
+        if isinstance(default, bool):
+            parser.add_argument(flag, action='store_const', const=True, default=None)
+        else:
+            kind = type(default) if default is not None and not isinstance(default, str) else str
+            parser.add_argument(flag, type=kind, default=None)
+    args = vars(parser.parse_args(argv))
+    config_file = args.pop('config')
+
+    config = dict(DEFAULTS)
+    if config_file:
+        with open(config_file) as f:
+            file_config = json.load(f)
+        unknown = set(file_config) - set(DEFAULTS)
+        if unknown:
+            parser.error(f"Unknown keys in {config_file}: {sorted(unknown)}")
+        config.update(file_config)
+    config.update({k: v for k, v in args.items() if v is not None})
+    # Let '--export-format none' and friends switch optional steps off
+    return {k: None if v == 'none' else v for k, v in config.items()}
+
+
+def configure_runtime(config):
+    import tensorflow as tf
+    if config['intra_op_threads']:
+        tf.config.threading.set_intra_op_parallelism_threads(config['intra_op_threads'])
+    if config['inter_op_threads']:
+        tf.config.threading.set_inter_op_parallelism_threads(config['inter_op_threads'])
+    if config['precision'] != 'float32':
+        tf.keras.mixed_precision.set_global_policy(config['precision'])
+
+
+def load_data(config):
+    """Return (train_data, val_data, class_names, train_images)."""
+    img_size = (config['img_size'], config['img_size'])
+    # Data preprocessing and augmentation; every pipeline keeps flow_from_directory's split and class order
+    if config['pipeline'] == 'shards':
+        import dataset_cache
+        shard_dir = config['shard_dir'] or config['data_dir'].rstrip('/\\') + '_shards'
+        dataset_cache.build(config['data_dir'], shard_dir, img_size)
+        train_data, val_data, class_names = dataset_cache.make_datasets(shard_dir, config['batch_size'])
+        train_images = len(dataset_cache.ShardedDataset(shard_dir).split()[0])
+    elif config['pipeline'] == 'tfdata':
+        from input_pipeline import make_datasets, list_split
+        train_data, val_data, class_names = make_datasets(config['data_dir'], img_size, config['batch_size'],
+                                                          cache_dir=config['cache_dir'])
+        train_images = len(list_split(config['data_dir'])[1][0])
+    else:
+        from input_pipeline import legacy_generators
+        train_data, val_data = legacy_generators(config['data_dir'], img_size, config['batch_size'])
+        class_names = sorted(train_data.class_indices, key=train_data.class_indices.get)
+        train_images = train_data.samples
+    return train_data, val_data, class_names, train_images
+
+
+# === Architectures ===
+# Backbone constructor name in tf.keras.applications and the (scale, offset) that maps our
+# [0, 1] inputs to what it was trained on, so serving preprocessing stays the same for every model
+ARCHITECTURES = {
+    'cnn': None,
+    'mobilenet_v2': ('MobileNetV2', 2.0, -1.0),
+    'mobilenet_v3_small': ('MobileNetV3Small', 255.0, 0.0),
+    'mobilenet_v3_large': ('MobileNetV3Large', 255.0, 0.0),
+    'efficientnet_b0': ('EfficientNetB0', 255.0, 0.0),
+    'efficientnet_v2_b0': ('EfficientNetV2B0', 255.0, 0.0),
+}
+
+def _build_cnn(num_classes, size):
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import Conv2D, MaxPooling2D, Flatten, Dense, Dropout
+    return Sequential([
+        Conv2D(32, (3,3), activation='relu', input_shape=(size, size, 3)),
+        MaxPooling2D(2,2),
+        Conv2D(64, (3,3), activation='relu'),
+        MaxPooling2D(2,2),
+        Conv2D(128, (3,3), activation='relu'),
+        MaxPooling2D(2,2),
+        Flatten(),
+        Dense(256, activation='relu'),
+        Dropout(0.5),
+        # Keep the softmax in float32 under mixed precision
+        Dense(num_classes, activation='softmax', dtype='float32')
+    ])
+
+def _build_transfer(num_classes, size, architecture, weights, fine_tune):
+    import tensorflow as tf
+    from tensorflow.keras import layers
+    constructor, scale, offset = ARCHITECTURES[architecture]
+    backbone = getattr(tf.keras.applications, constructor)(
+        include_top=False, weights=weights, input_shape=(size, size, 3))
+    backbone.trainable = fine_tune
+    inputs = layers.Input((size, size, 3))
+    x = layers.Rescaling(scale, offset=offset)(inputs)
+    # training=False keeps BatchNorm statistics frozen even while fine-tuning
+    x = backbone(x, training=False)
+    # Global pooling instead of Flatten: the head is num_features x num_classes weights
+    x = layers.GlobalAveragePooling2D()(x)
+    x = layers.Dropout(0.2)(x)
+    outputs = layers.Dense(num_classes, activation='softmax', dtype='float32')(x)
+    return tf.keras.Model(inputs, outputs, name=architecture)
+
+def build_model(num_classes, config):
+    from tensorflow.keras.optimizers import Adam
+    architecture, size = config['architecture'], config['img_size']
+    if architecture not in ARCHITECTURES:
+        raise ValueError(f"Unknown architecture '{architecture}', expected one of {sorted(ARCHITECTURES)}")
+    if ARCHITECTURES[architecture] is None:
+        model = _build_cnn(num_classes, size)
+    else:
+        model = _build_transfer(num_classes, size, architecture, config['weights'], config['fine_tune'])
+    # Compile the model
+    model.compile(optimizer=Adam(config['learning_rate']), loss='categorical_crossentropy', metrics=['accuracy'])
+    return model
+
+
+# === Checkpoints and logging ===
+def _checkpoint_paths(config):
+    d = config['checkpoint_dir']
+    return os.path.join(d, 'last.h5'), os.path.join(d, 'state.json')
+
+def load_checkpoint(config):
+    """(model, state) from the last checkpoint, or (None, None)."""
+    model_path, state_path = _checkpoint_paths(config)
+    if not (os.path.exists(model_path) and os.path.exists(state_path)):
+        return None, None
+    from tensorflow.keras.models import load_model
+    with open(state_path) as f:
+        state = json.load(f)
+    return load_model(model_path), state
+
+def make_callbacks(config, train_images, history):
+    import tensorflow as tf
+    model_path, state_path = _checkpoint_paths(config)
+    os.makedirs(config['checkpoint_dir'], exist_ok=True)
+
+    class EpochLogger(tf.keras.callbacks.Callback):
+        """Per-epoch wall time/throughput to a JSONL file, plus checkpoint + state every N epochs."""
+
+        def on_epoch_begin(self, epoch, logs=None):
+            self.started = time.perf_counter()
+
+        def on_epoch_end(self, epoch, logs=None):
+            seconds = time.perf_counter() - self.started
+            record = {'epoch': epoch + 1, 'wall_s': round(seconds, 3),
+                      'images_per_s': round(train_images / seconds, 1),
+                      'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+            record.update({k: float(v) for k, v in (logs or {}).items()})
+            for k, v in (logs or {}).items():
+                history.setdefault(k, []).append(float(v))
+            with open(config['metrics_log'], 'a') as f:
+                f.write(json.dumps(record) + '\n')
+
+            if (epoch + 1) % config['checkpoint_every'] == 0 or epoch + 1 == config['epochs']:
+                # Model first, then state: a crash in between resumes from the older state safely
+                tmp = model_path + '.tmp.h5'
+                self.model.save(tmp)
+                os.replace(tmp, model_path)
+                with open(state_path + '.tmp', 'w') as f:
+                    json.dump({'epoch': epoch + 1, 'history': history, 'config': config}, f)
+                os.replace(state_path + '.tmp', state_path)
+
+    callbacks = [EpochLogger()]
+    if config['early_stopping_patience']:
+        callbacks.append(tf.keras.callbacks.EarlyStopping(
+            monitor='val_loss', patience=config['early_stopping_patience'], restore_best_weights=True))
+    return callbacks
+
+
+def save_outputs(model, history, class_names, config):
+    # Save the trained model
+    model.save(config['model_path'])
+    # Save class labels
+    with open('class_labels.txt', 'w') as f:
+        for name in class_names:
+            f.write(name + '\n')
+    # Plot and save training accuracy chart
+    import matplotlib
+    if config['headless']:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    plt.plot(history.get('accuracy', []), label='Train Accuracy')
+    plt.plot(history.get('val_accuracy', []), label='Validation Accuracy')
+    plt.xlabel('Epochs')
+    plt.ylabel('Accuracy')
+    plt.legend()
+    plt.title('Model Accuracy')
+    plt.savefig('training_plot.png')
+    # Export an optimized inference artifact (see export_model.py / INFERENCE_BACKEND) last: the
+    # model, labels and plot above are already saved, so a failed conversion costs only the artifact
+    if config['export_format']:
+        try:
+            from export_model import export
+            export(model, config['export_format'], quantize=config['export_quantize'],
+                   calibration_dir=config['data_dir'])
+        except Exception as e:
+            print(f"[Warning] {config['export_format']} export failed ({type(e).__name__}: {e}); "
+                  f"retry with `python export_model.py --model {config['model_path']} "
+                  f"--format {config['export_format']}`")
+    if not config['headless']:
+        plt.show()
+
+
+def train(config):
+    configure_runtime(config)
+    train_data, val_data, class_names, train_images = load_data(config)
+
+    model, state = load_checkpoint(config) if config['resume'] else (None, None)
+    if model is not None:
+        start_epoch, history = state['epoch'], state['history']
+        print(f"Resuming from {config['checkpoint_dir']} at epoch {start_epoch}")
+    else:
+        model, start_epoch, history = build_model(len(class_names), config), 0, {}
+
+    # Train the model
+    if start_epoch < config['epochs']:
+        model.fit(train_data, validation_data=val_data, epochs=config['epochs'], initial_epoch=start_epoch,
+                  callbacks=make_callbacks(config, train_images, history))
+    save_outputs(model, history, class_names, config)
+    return model, history
+
+
+if __name__ == '__main__':
+    train(parse_config())
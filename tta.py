@@ -0,0 +1,56 @@
+"""Test-time augmentation and model ensembling for low-confidence predictions.
+
+With TTA_MODE=auto, a prediction whose top-1 confidence is below TTA_THRESHOLD
+percent is re-run on flipped, cropped and rescaled views of the same image,
+optionally across the extra model files in ENSEMBLE_MODELS. Each model sees
+all the views as a single batch. The final prediction is the mean
+probability vector. TTA_MODE=always does this for every image.
+"""
+import os
+
+import numpy as np
+
+MODE = os.environ.get('TTA_MODE', 'off')  # 'off', 'auto' or 'always'
+THRESHOLD = float(os.environ.get('TTA_THRESHOLD', 60))  # percent
+VIEWS = tuple(v for v in os.environ.get('TTA_VIEWS', 'flip,crop,scale').split(',') if v)
+ENSEMBLE_MODELS = [p for p in os.environ.get('ENSEMBLE_MODELS', '').split(',') if p]
+CROP = 0.875
+SCALE = 0.75
+_SCALE = np.float32(1.0 / 255.0)
+
+
+def _resample(image, top, left, height, width):
+    """Nearest-neighbour crop of image[top:top+height, left:left+width] back to the full size."""
+    h, w = image.shape[:2]
+    rows = top + (np.arange(h) * height // h)
+    cols = left + (np.arange(w) * width // w)
+    return image[rows[:, None], cols[None, :]]
+
+def views(image, kinds=VIEWS):
+    """Stack of augmented copies of one (H, W, 3) uint8 image, the original first."""
+    h, w = image.shape[:2]
+    out = [image]
+    if 'flip' in kinds:
+        out += [image[:, ::-1], image[::-1, :]]
+    if 'crop' in kinds:
+        ch, cw = int(h * CROP), int(w * CROP)
+        for top, left in ((0, 0), (0, w - cw), (h - ch, 0), (h - ch, w - cw), ((h - ch) // 2, (w - cw) // 2)):
+            out.append(_resample(image, top, left, ch, cw))
+    if 'scale' in kinds:
+        sh, sw = int(h * SCALE), int(w * SCALE)
+        out.append(_resample(image, (h - sh) // 2, (w - sw) // 2, sh, sw))
+    return np.stack(out)
+
+def should_run(probs, mode=MODE, threshold=THRESHOLD):
+    if mode == 'always':
+        return True
+    return mode == 'auto' and float(np.max(probs)) * 100 < threshold
+
+def predict(image, predict_fns, kinds=VIEWS):
+    """Mean probabilities over every view and every model; one batched call per model."""
+    batch = np.multiply(views(image, kinds), _SCALE, dtype=np.float32)
+    return np.mean([np.asarray(fn(batch)).mean(axis=0) for fn in predict_fns], axis=0)
+
+def config():
+    """The settings above that change a prediction (the prediction cache is keyed on them)."""
+    return {'mode': MODE, 'threshold': THRESHOLD, 'views': list(VIEWS), 'ensemble': ENSEMBLE_MODELS}
@@ -0,0 +1,235 @@
+"""Content-addressed upload store.
+
+Uploads are streamed to disk in chunks while being hashed and stored once per
+content under static/uploaded/<aa>/<bb>/<sha256><ext>, so two users sending
+IMG_0001.jpg never overwrite each other and re-uploads cost no extra space.
+Next to each original, ingest writes the decoded inference input
+(<sha256>.input.npy, IMG_SIZE uint8) and the report thumbnail (<sha256>.thumb.jpg).
+A background sweeper deletes entries older than UPLOAD_MAX_AGE_DAYS and then
+the least recently uploaded ones until the store fits in UPLOAD_STORE_MAX_MB.
+"""
+import hashlib
+import os
+import threading
+import time
+import uuid
+
+import numpy as np
+from PIL import Image
+
+import preprocessing
+import reports
+
+UPLOAD_ROOT = reports.UPLOAD_FOLDER
+CHUNK_SIZE = 256 * 1024
+MAX_BYTES = int(float(os.environ.get('UPLOAD_STORE_MAX_MB', 2048)) * 1024 * 1024)
+MAX_AGE_S = float(os.environ.get('UPLOAD_MAX_AGE_DAYS', 30)) * 86400
+SWEEP_INTERVAL_S = float(os.environ.get('UPLOAD_SWEEP_INTERVAL_S', 600))
+ALLOWED_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp', '.tif', '.tiff')
+
+INPUT_SUFFIX = '.input.npy'
+THUMB_SUFFIX = '.thumb.jpg'
+
+
+class UploadGone(Exception):
+    """The upload was swept before it could be used; the client has to send it again."""
+
+
+class Upload:
+    __slots__ = ('digest', 'path', 'name', 'size', 'new')
+
+    def __init__(self, digest, path, name, size, new):
+        self.digest = digest
+        self.path = path  # original file on disk
+        self.name = name  # path relative to UPLOAD_ROOT, e.g. 'ab/cd/abcd....jpg'
+        self.size = size
+        self.new = new  # False when identical bytes were already stored
+
+    @property
+    def input_path(self):
+        return derived_path(self.path, INPUT_SUFFIX)
+
+    @property
+    def thumbnail_path(self):
+        return derived_path(self.path, THUMB_SUFFIX)
+
+    def load_input(self):
+        """The (H, W, 3) uint8 model input decoded at ingest."""
+        return np.load(self.input_path)
+
+    def original_size(self):
+        """(width, height) of the uploaded photo, read from its header only."""
+        with Image.open(self.path) as img:
+            return img.size
+
+
+def derived_path(original, suffix):
+    return os.path.splitext(original)[0] + suffix
+
+
+class UploadStore:
+    def __init__(self, root=UPLOAD_ROOT, max_bytes=MAX_BYTES, max_age_s=MAX_AGE_S,
+                 sweep_interval_s=SWEEP_INTERVAL_S):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self.sweep_interval_s = sweep_interval_s
+        self._tmp = os.path.join(root, 'tmp')
+        os.makedirs(self._tmp, exist_ok=True)
+        self._lock = threading.Lock()
+        self.ingested = 0
+        self.deduplicated = 0
+        self.swept = 0
+        self._sweeper = None
+
+    # === Ingest ===
+    def _location(self, digest, ext):
+        name = os.path.join(digest[:2], digest[2:4], digest + ext)
+        return name, os.path.join(self.root, name)
+
+    def ingest(self, stream, filename):
+        """Stream `stream` to disk while hashing; returns an Upload with its derived files in place."""
+        ext = os.path.splitext(filename or '')[1].lower()
+        if ext not in ALLOWED_EXTENSIONS:
+            ext = '.img'
+        tmp = os.path.join(self._tmp, uuid.uuid4().hex)
+        h = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp, 'wb') as f:
+                for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                    h.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            digest = h.hexdigest()
+            name, path = self._location(digest, ext)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with self._lock:
+                new = not os.path.exists(path)
+                if new:
+                    os.replace(tmp, path)
+                else:
+                    # Touch the original so retention counts from the latest upload
+                    os.utime(path)
+                    self.deduplicated += 1
+                self.ingested += 1
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        upload = Upload(digest, path, name, size, new)
+        try:
+            self._derive(upload)
+        except Exception:
+            # Not an image we can decode: keep nothing around for it
+            if new:
+                self._remove([path, upload.input_path, upload.thumbnail_path])
+            raise
+        return upload
+
+    def _derive(self, upload):
+        # Decoded once here; predictions and reports reuse these instead of the original
+        if not os.path.exists(upload.input_path):
+            tmp = upload.input_path + f'.{uuid.uuid4().hex}.tmp.npy'
+            np.save(tmp, np.asarray(preprocessing.decode(upload.path)))
+            os.replace(tmp, upload.input_path)
+        if not os.path.exists(upload.thumbnail_path):
+            reports.write_thumbnail(upload.path, upload.thumbnail_path)
+
+    def load(self, upload):
+        """(model input, original (width, height)), re-deriving the input if only it went missing."""
+        try:
+            return upload.load_input(), upload.original_size()
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            if not os.path.exists(upload.path):
+                raise UploadGone(f"{upload.name} was removed by the upload sweeper")
+            # Touch it so the next sweep does not pick it again straight away
+            os.utime(upload.path)
+            self._derive(upload)
+        return upload.load_input(), upload.original_size()
+
+    def get(self, name):
+        """Upload for a stored relative name, or None once it has been swept."""
+        path = os.path.join(self.root, name)
+        if not os.path.exists(path):
+            return None
+        digest = os.path.splitext(os.path.basename(name))[0]
+        return Upload(digest, path, name, os.path.getsize(path), False)
+
+    # === Retention ===
+    @staticmethod
+    def _remove(files):
+        for f in files:
+            try:
+                os.remove(f)
+            except OSError:
+                pass
+
+    def _entries(self):
+        """{stem: [original mtime, total bytes incl. derived files, [files], original path]}."""
+        groups = {}
+        for dirpath, dirs, files in os.walk(self.root):
+            if dirpath == self._tmp:
+                dirs[:] = []
+                continue
+            for f in files:
+                full = os.path.join(dirpath, f)
+                stem = f.split('.', 1)[0]
+                try:
+                    st = os.stat(full)
+                except OSError:
+                    continue
+                entry = groups.setdefault(os.path.join(dirpath, stem), [0, 0, [], None])
+                if not (f.endswith(INPUT_SUFFIX) or f.endswith(THUMB_SUFFIX)):
+                    entry[0] = st.st_mtime
+                    entry[3] = full
+                entry[1] += st.st_size
+                entry[2].append(full)
+        return groups
+
+    def sweep(self, now=None):
+        """Apply the age and size limits; returns the number of uploads removed."""
+        now = now or time.time()
+        groups = sorted(self._entries().values(), key=lambda e: e[0])
+        total = sum(e[1] for e in groups)
+        removed = 0
+        with self._lock:
+            for mtime, size, files, original in groups:
+                if now - mtime <= self.max_age_s and total <= self.max_bytes:
+                    break
+                # Listed before taking the lock: skip uploads ingest has deduplicated (touched) since
+                try:
+                    if original and os.path.getmtime(original) != mtime:
+                        continue
+                except OSError:
+                    pass
+                self._remove(files)
+                total -= size
+                removed += 1
+            self.swept += removed
+        # Leftovers of interrupted ingests
+        for f in os.listdir(self._tmp):
+            full = os.path.join(self._tmp, f)
+            if now - os.path.getmtime(full) > 3600:
+                os.remove(full)
+        return removed
+
+    def start_sweeper(self):
+        if self._sweeper is None:
+            self._sweeper = threading.Thread(target=self._sweep_loop, name='upload-sweeper', daemon=True)
+            self._sweeper.start()
+
+    def _sweep_loop(self):
+        while True:
+            try:
+                self.sweep()
+            except OSError as e:
+                print(f"[Warning] Upload sweep failed: {e}")
+            time.sleep(self.sweep_interval_s)
+
+    def stats(self):
+        groups = self._entries().values()
+        return {'uploads': len(groups), 'bytes': sum(e[1] for e in groups), 'max_bytes': self.max_bytes,
+                'max_age_days': round(self.max_age_s / 86400, 2), 'ingested': self.ingested,
+                'deduplicated': self.deduplicated, 'swept': self.swept}